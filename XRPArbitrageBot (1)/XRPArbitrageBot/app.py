@@ -21,9 +21,15 @@ app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
 # Configure the database
 app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///xrp_trading.db")
 app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
+    "pool_recycle": 1800,
     "pool_pre_ping": True,
 }
+if not app.config["SQLALCHEMY_DATABASE_URI"].startswith("sqlite"):
+    # Keep enough pooled connections for the engine, writer, log flusher and request threads
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"].update({
+        "pool_size": 10,
+        "max_overflow": 20,
+    })
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
 # Initialize the app with the extension
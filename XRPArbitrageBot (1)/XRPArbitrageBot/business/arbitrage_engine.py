@@ -1,7 +1,9 @@
 import time
+import queue
 import threading
 import logging
 from datetime import datetime
+from sqlalchemy.orm import scoped_session, sessionmaker
 from app import db
 from models import ArbitrageOpportunity, TradingConfig
 from core.price_monitor import PriceMonitor
@@ -10,22 +12,61 @@ from core.trade_executor import TradeExecutor
 from core.risk_controller import RiskController
 from core.data_logger import DataLogger
 from core.config_manager import ConfigManager
+from core.profit_analyzer import ProfitAnalyzer
+from core.opportunity import Opportunity
+from core import arb_math
 
 class ArbitrageEngine:
     """Main arbitrage strategy engine"""
     
+    WRITE_QUEUE_SIZE = 1024
+    WRITE_BATCH_SIZE = 64
+    STATUS_CACHE_TTL = 1.5  # seconds
+    
+    # Opportunity detection parameters
+    FEE_RATE = 0.0006  # 0.06% taker fee, charged on both sides
+    MIN_VOLUME = 1000.0  # Minimum 24h volume per pair
+    MIN_SPREAD_PCT = 0.08  # 0.08% minimum after fees
+    MIN_PROFIT = 0.10  # Minimum $0.10 estimated net profit
+    MAX_SPREAD_MUL = 2.0  # Scale trade amount up to 2x for large spreads
+    SPREAD_MUL_BASE = 0.3  # Spread percentage that maps to a 1x trade amount
+    
+    # Indexed by arb_math side (0 = sell USDT, 1 = sell USDC)
+    OPPORTUNITY_TYPES = ('sell_usdt_buy_usdc', 'sell_usdc_buy_usdt')
+    SELL_PAIRS = ('XRP/USDT', 'XRP/USDC')
+    BUY_PAIRS = ('XRP/USDC', 'XRP/USDT')
+    
     def __init__(self):
         self.running = False
         self.thread = None
+        self._stop_evt = threading.Event()  # Set by stop() to interrupt waits
+        self.maintenance_thread = None
+        self.maintenance_interval = 30  # Seconds between health/timeout/rebalance runs
+        self.executor_lock = threading.Lock()  # pending_orders is shared with the maintenance thread
+        self.system_health = {'healthy': True, 'warnings': [], 'errors': []}
+        self._threshold_config = None  # Config the hoisted spread threshold was derived from
+        self._spread_threshold_pct = 0.0
+        self._last_rejected_tick = None  # (usdt, usdc, config) of the last sub-threshold tick
+        self._status_cache = (None, 0.0)  # (status, built_at)
+        self._status_lock = threading.Lock()
         self.logger = logging.getLogger(__name__)
+        self._dbg = self.logger.isEnabledFor(logging.DEBUG)  # Refreshed with the config
         
         # Initialize components
-        self.price_monitor = PriceMonitor()
+        self.price_monitor = PriceMonitor.get_monitor()
         self.balance_manager = BalanceManager()
         self.trade_executor = TradeExecutor()
         self.risk_controller = RiskController()
+        self.volume_tracker = self.risk_controller.volume_tracker
         self.data_logger = DataLogger()
         self.config_manager = ConfigManager()
+        self.profit_analyzer = ProfitAnalyzer()
+        
+        # Opportunity persistence runs on a writer thread, off the detection path
+        self._write_q = queue.Queue(maxsize=self.WRITE_QUEUE_SIZE)
+        self.writer_thread = threading.Thread(target=self._writer_loop)
+        self.writer_thread.daemon = True
+        self.writer_thread.start()
         
         # Start price monitoring
         self.price_monitor.start_monitoring()
@@ -37,10 +78,17 @@ class ArbitrageEngine:
             return
         
         self.running = True
+        self._stop_evt.clear()
+        self._status_cache = (None, 0.0)
         self.thread = threading.Thread(target=self._main_loop)
         self.thread.daemon = True
         self.thread.start()
         
+        # Health checks, order timeouts and rebalancing run on their own slower loop
+        self.maintenance_thread = threading.Thread(target=self._maintenance_loop)
+        self.maintenance_thread.daemon = True
+        self.maintenance_thread.start()
+        
         self.data_logger.log_system_event("STARTED", "Arbitrage engine started", "ArbitrageEngine")
         self.logger.info("Arbitrage engine started")
     
@@ -50,11 +98,21 @@ class ArbitrageEngine:
             return
         
         self.running = False
+        self._stop_evt.set()
+        self._status_cache = (None, 0.0)
+        
+        # Wake the main loop so it notices the stop request
+        self.price_monitor.tick_event.set()
+        
+        # Bounded joins so a hung exchange call can't wedge shutdown
         if self.thread:
-            self.thread.join()
+            self.thread.join(timeout=10)
+        if self.maintenance_thread:
+            self.maintenance_thread.join(timeout=10)
         
         # Cancel any pending orders
-        self.trade_executor.cancel_pending_orders()
+        with self.executor_lock:
+            self.trade_executor.cancel_pending_orders()
         
         self.data_logger.log_system_event("STOPPED", "Arbitrage engine stopped", "ArbitrageEngine")
         self.logger.info("Arbitrage engine stopped")
@@ -65,31 +123,32 @@ class ArbitrageEngine:
     
     def _main_loop(self):
         """Main arbitrage detection and execution loop"""
+        tick_event = self.price_monitor.tick_event
+        
         while self.running:
             try:
+                # Block until the price monitor publishes a new tick
+                tick_event.wait(timeout=5)
+                tick_event.clear()
+                
+                if not self.running:
+                    break
+                
                 # Get current configuration
                 config = self.config_manager.get_config()
                 if not config:
                     self.logger.error("No configuration found, stopping engine")
                     break
                 
-                # Check system health
-                health = self.risk_controller.check_system_health()
-                if not health['healthy']:
-                    self.logger.error(f"System health check failed: {health['errors']}")
-                    self.data_logger.log_risk_event(
-                        "SYSTEM_HEALTH", 
-                        f"Health check failed: {health['errors']}", 
-                        "ERROR"
-                    )
-                    time.sleep(10)  # Wait before retrying
+                # Health is refreshed by the maintenance timer
+                if not self.system_health['healthy']:
                     continue
                 
                 # Check for arbitrage opportunities
                 opportunity = self._detect_arbitrage_opportunity(config)
                 
                 if opportunity:
-                    self.logger.info(f"Arbitrage opportunity detected: {opportunity['spread_percentage']:.4f}%")
+                    self.logger.info(f"Arbitrage opportunity detected: {opportunity.spread_percentage:.4f}%")
                     self.data_logger.log_arbitrage_opportunity(opportunity)
                     
                     # Store opportunity in database
@@ -98,112 +157,120 @@ class ArbitrageEngine:
                     # Execute trade if risk checks pass
                     self._execute_opportunity(opportunity, config)
                 
-                # Check for order timeouts
-                self.trade_executor.check_order_timeouts()
-                
-                # Rebalance stablecoins if needed
-                self.balance_manager.rebalance_stablecoins()
-                
-                # Sleep between iterations
-                time.sleep(5)  # Check every 5 seconds
-                
             except Exception as e:
                 self.logger.error(f"Error in arbitrage main loop: {e}")
                 self.data_logger.log_error(f"Main loop error: {e}", "ArbitrageEngine", e)
-                time.sleep(10)  # Wait before retrying on error
+                if self._stop_evt.wait(10):  # Wait before retrying on error
+                    break
+    
+    def _maintenance_loop(self):
+        """Run health checks, order timeouts and rebalancing off the detection path"""
+        while self.running:
+            delay = self.maintenance_interval
+            try:
+                # Check system health
+                health = self.risk_controller.check_system_health()
+                self.system_health = health
+                
+                if not health['healthy']:
+                    self.logger.error(f"System health check failed: {health['errors']}")
+                    self.data_logger.log_risk_event(
+                        "SYSTEM_HEALTH", 
+                        f"Health check failed: {health['errors']}", 
+                        "ERROR"
+                    )
+                    delay = 10  # Re-check sooner while unhealthy
+                else:
+                    # Check for order timeouts
+                    with self.executor_lock:
+                        self.trade_executor.check_order_timeouts()
+                    
+                    # Rebalance stablecoins if needed
+                    self.balance_manager.rebalance_stablecoins()
+            
+            except Exception as e:
+                self.logger.error(f"Error in engine maintenance: {e}")
+                self.data_logger.log_error(f"Maintenance error: {e}", "ArbitrageEngine", e)
+            
+            if self._stop_evt.wait(delay):
+                break
     
     def _detect_arbitrage_opportunity(self, config):
         """Detect directional arbitrage opportunities with improved logic"""
         try:
-            # Get current prices
-            prices = self.price_monitor.get_current_prices()
+            # Read the latest snapshot straight from the monitor's tick buffer
+            prices = self.price_monitor.latest_tick() or self.price_monitor.get_current_prices()
             
             if 'XRP/USDT' not in prices or 'XRP/USDC' not in prices:
                 return None
             
             usdt_price = prices['XRP/USDT']['price']
             usdc_price = prices['XRP/USDC']['price']
-            usdt_volume = prices['XRP/USDT']['volume']
-            usdc_volume = prices['XRP/USDC']['volume']
             
-            # IMPROVED DIRECTIONAL ARBITRAGE LOGIC
-            # Calculate percentage spread (not just absolute)
-            if usdt_price > usdc_price:
-                # USDT is higher, sell XRP/USDT, buy XRP/USDC
-                spread_percentage = ((usdt_price - usdc_price) / usdc_price) * 100
-                opportunity_type = 'sell_usdt_buy_usdc'
-                sell_pair = 'XRP/USDT'
-                buy_pair = 'XRP/USDC'
-                sell_price = usdt_price
-                buy_price = usdc_price
-                higher_price = usdt_price
-                lower_price = usdc_price
-            else:
-                # USDC is higher, sell XRP/USDC, buy XRP/USDT  
-                spread_percentage = ((usdc_price - usdt_price) / usdt_price) * 100
-                opportunity_type = 'sell_usdc_buy_usdt'
-                sell_pair = 'XRP/USDC'
-                buy_pair = 'XRP/USDT'
-                sell_price = usdc_price
-                buy_price = usdt_price
-                higher_price = usdc_price
-                lower_price = usdt_price
-            
-            spread = higher_price - lower_price
-            
-            # Enhanced threshold check with minimum profitable spread
-            minimum_profitable_spread = 0.08  # 0.08% minimum after fees
-            if spread_percentage < max(config.spread_threshold * 100, minimum_profitable_spread):
+            # Unchanged quotes (to 6 decimals) that were already below threshold
+            tick_key = (round(usdt_price, 6), round(usdc_price, 6), config)
+            if tick_key == self._last_rejected_tick:
                 return None
             
+            # Fast reject: most ticks are below threshold, so bail before any setup
+            if config is not self._threshold_config:
+                self._refresh_thresholds(config)
+            lo = usdt_price if usdt_price < usdc_price else usdc_price
+            hi = usdc_price if usdt_price < usdc_price else usdt_price
+            if (hi - lo) * 100 < lo * self._spread_threshold_pct:
+                self._last_rejected_tick = tick_key
+                return None
+            
+            usdt_volume = prices['XRP/USDT']['volume']
+            usdc_volume = prices['XRP/USDC']['volume']
+            
             # Volume validation - ensure sufficient liquidity
-            min_volume_24h = 1000.0  # Minimum 24h volume
-            if usdt_volume < min_volume_24h or usdc_volume < min_volume_24h:
-                self.logger.debug(f"Insufficient volume: USDT={usdt_volume}, USDC={usdc_volume}")
+            if usdt_volume < self.MIN_VOLUME or usdc_volume < self.MIN_VOLUME:
+                if self._dbg:
+                    self.logger.debug("Insufficient volume: USDT=%s, USDC=%s", usdt_volume, usdc_volume)
                 return None
             
             # Calculate safe trade amount with volatility consideration
             max_safe_amount = self.risk_controller.calculate_max_safe_trade_amount(config)
             
-            # Adjust trade amount based on spread size (larger spreads allow larger trades)
-            spread_multiplier = min(2.0, spread_percentage / 0.3)  # Scale up to 2x for large spreads
-            adjusted_base_amount = config.trade_amount * spread_multiplier
+            # Spread, sizing and fee-adjusted profit are computed in the compiled kernel
+            (status, side, spread, spread_percentage, sell_price, buy_price, trade_amount,
+             gross_profit, estimated_fees, estimated_net_profit, spread_multiplier) = arb_math.evaluate(
+                usdt_price, usdc_price, config.trade_amount, max_safe_amount,
+                self._spread_threshold_pct, self.FEE_RATE, self.MIN_PROFIT,
+                self.SPREAD_MUL_BASE, self.MAX_SPREAD_MUL
+            )
             
-            trade_amount = min(adjusted_base_amount, max_safe_amount)
+            if status == arb_math.REJECT_SPREAD:
+                return None
             
-            if trade_amount <= 0:
+            if status == arb_math.REJECT_AMOUNT:
                 self.logger.warning("No safe trade amount available")
                 return None
             
-            # Enhanced profit estimation with fee consideration
-            gross_profit = trade_amount * spread
-            estimated_fees = trade_amount * (sell_price + buy_price) * 0.0006  # 0.06% taker fee both sides
-            estimated_net_profit = gross_profit - estimated_fees
-            
-            # Minimum profit threshold
-            min_profit_threshold = 0.10  # Minimum $0.10 profit
-            if estimated_net_profit < min_profit_threshold:
-                self.logger.debug(f"Profit too small: {estimated_net_profit:.4f} < {min_profit_threshold}")
+            if status == arb_math.REJECT_PROFIT:
+                if self._dbg:
+                    self.logger.debug("Profit too small: %.4f < %s", estimated_net_profit, self.MIN_PROFIT)
                 return None
             
-            opportunity = {
-                'usdt_price': usdt_price,
-                'usdc_price': usdc_price,
-                'spread': spread,
-                'spread_percentage': spread_percentage,
-                'opportunity_type': opportunity_type,
-                'sell_pair': sell_pair,
-                'buy_pair': buy_pair,
-                'sell_price': sell_price,
-                'buy_price': buy_price,
-                'amount': trade_amount,
-                'estimated_profit': estimated_net_profit,
-                'gross_profit': gross_profit,
-                'estimated_fees': estimated_fees,
-                'volume_usdt': usdt_volume,
-                'volume_usdc': usdc_volume,
-                'spread_multiplier': spread_multiplier
-            }
+            opportunity = Opportunity(
+                usdt_price=usdt_price,
+                usdc_price=usdc_price,
+                spread=spread,
+                spread_percentage=spread_percentage,
+                opportunity_type=self.OPPORTUNITY_TYPES[side],
+                sell_pair=self.SELL_PAIRS[side],
+                buy_pair=self.BUY_PAIRS[side],
+                sell_price=sell_price,
+                buy_price=buy_price,
+                amount=trade_amount,
+                estimated_profit=estimated_net_profit,
+                gross_profit=gross_profit,
+                estimated_fees=estimated_fees,
+                volume_usdt=usdt_volume,
+                volume_usdc=usdc_volume,
+                spread_multiplier=spread_multiplier
+            )
             
             return opportunity
             
@@ -211,24 +278,89 @@ class ArbitrageEngine:
             self.logger.error(f"Error detecting arbitrage opportunity: {e}")
             return None
     
+    def _refresh_thresholds(self, config):
+        """Recompute the spread threshold (percent) and debug flag once per config refresh"""
+        self._spread_threshold_pct = max(config.spread_threshold * 100, self.MIN_SPREAD_PCT)
+        self._threshold_config = config
+        self._dbg = self.logger.isEnabledFor(logging.DEBUG)
+    
     def _store_opportunity(self, opportunity):
-        """Store arbitrage opportunity in database"""
+        """Queue arbitrage opportunity for storage in database"""
+        self._enqueue_write('insert', opportunity)
+    
+    def _enqueue_write(self, kind, opportunity):
+        """Hand a write to the writer thread without blocking"""
         try:
-            db_opportunity = ArbitrageOpportunity(
-                usdt_price=opportunity['usdt_price'],
-                usdc_price=opportunity['usdc_price'],
-                spread=opportunity['spread'],
-                spread_percentage=opportunity['spread_percentage'],
-                opportunity_type=opportunity['opportunity_type'],
-                executed=False
-            )
+            self._write_q.put_nowait((kind, opportunity))
+        except queue.Full:
+            self.logger.warning(f"Opportunity write queue full, dropping {kind}")
+    
+    def _writer_loop(self):
+        """Drain queued opportunity writes and commit them in batches"""
+        from app import app
+        with app.app_context():
+            # Dedicated session so writes never share a transaction with the request/engine threads
+            self._write_session = scoped_session(sessionmaker(bind=db.engine))
             
-            db.session.add(db_opportunity)
-            db.session.commit()
+            while True:
+                batch = [self._write_q.get()]
+                while len(batch) < self.WRITE_BATCH_SIZE:
+                    try:
+                        batch.append(self._write_q.get_nowait())
+                    except queue.Empty:
+                        break
+                
+                self._flush_writes(batch)
+    
+    def _flush_writes(self, batch):
+        """Insert new opportunities and mark executed ones in one transaction"""
+        session = self._write_session
+        inserts = []
+        try:
+            # Inserts are applied first so executed marks in the same batch see their ids
+            inserts = [
+                (opportunity, ArbitrageOpportunity(
+                    usdt_price=opportunity.usdt_price,
+                    usdc_price=opportunity.usdc_price,
+                    spread=opportunity.spread,
+                    spread_percentage=opportunity.spread_percentage,
+                    opportunity_type=opportunity.opportunity_type,
+                    executed=False
+                ))
+                for kind, opportunity in batch if kind == 'insert'
+            ]
+            
+            if inserts:
+                session.add_all([row for _, row in inserts])
+                session.flush()
+                
+                # Remember the rows so execution can be recorded by primary key
+                for opportunity, row in inserts:
+                    opportunity.db_id = row.id
+            
+            executed_ids = [
+                opportunity.db_id for kind, opportunity in batch
+                if kind == 'executed' and opportunity.db_id
+            ]
+            
+            if executed_ids:
+                session.query(ArbitrageOpportunity).filter(
+                    ArbitrageOpportunity.id.in_(executed_ids)
+                ).update({'executed': True}, synchronize_session=False)
+            
+            session.commit()
             
         except Exception as e:
-            self.logger.error(f"Error storing opportunity: {e}")
-            db.session.rollback()
+            self.logger.error(f"Error storing opportunities: {e}")
+            session.rollback()
+            
+            # Ids assigned by the rolled-back flush may be reused by later rows
+            for opportunity, _ in inserts:
+                opportunity.db_id = 0
+        
+        finally:
+            # Release the connection between batches
+            session.remove()
     
     def _execute_opportunity(self, opportunity, config):
         """Execute arbitrage opportunity with enhanced risk checks"""
@@ -247,18 +379,22 @@ class ArbitrageEngine:
             
             # Use the volatility-adjusted amount from risk check
             adjusted_amount = risk_check['adjusted_amount']
-            if adjusted_amount != opportunity['amount']:
-                self.logger.info(f"Position size adjusted for volatility: {opportunity['amount']:.2f} -> {adjusted_amount:.2f} XRP")
-                opportunity['amount'] = adjusted_amount
+            if adjusted_amount != opportunity.amount:
+                self.logger.info(f"Position size adjusted for volatility: {opportunity.amount:.2f} -> {adjusted_amount:.2f} XRP")
+                opportunity.amount = adjusted_amount
             
             # Execute the arbitrage trade
-            self.logger.info(f"Executing ATOMIC arbitrage trade: {opportunity['amount']} XRP")
+            self.logger.info(f"Executing ATOMIC arbitrage trade: {opportunity.amount} XRP")
+            
+            with self.executor_lock:
+                trade_result = self.trade_executor.execute_arbitrage_trade(opportunity)
             
-            trade_result = self.trade_executor.execute_arbitrage_trade(opportunity)
+            # Balances and pending orders changed; the next risk check must see them
+            self.risk_controller.invalidate_trade_state()
             
             if trade_result:
                 # Track volume and profit/loss
-                trade_value_usd = opportunity['amount'] * opportunity['sell_price']
+                trade_value_usd = opportunity.amount * opportunity.sell_price
                 profit_loss = trade_result.get('profit_loss', 0)
                 
                 self.volume_tracker.track_trade_volume(trade_value_usd, profit_loss)
@@ -270,16 +406,16 @@ class ArbitrageEngine:
                 
                 self.data_logger.log_trade({
                     'type': 'atomic_arbitrage',
-                    'amount': opportunity['amount'],
+                    'amount': opportunity.amount,
                     'profit_loss': profit_loss,
-                    'spread': opportunity['spread_percentage'],
+                    'spread': opportunity.spread_percentage,
                     'execution_type': trade_result.get('execution_type', 'atomic'),
                     'slippage': trade_result.get('slippage', {})
                 }, 'completed')
                 
                 # Check if we need to activate any circuit breakers based on performance
                 if profit_loss < -50:  # Large single trade loss
-                    self.risk_controller.volume_tracker.activate_circuit_breaker(
+                    self.volume_tracker.activate_circuit_breaker(
                         'large_loss',
                         f'Large single trade loss: ${abs(profit_loss):.2f}',
                         abs(profit_loss),
@@ -291,7 +427,7 @@ class ArbitrageEngine:
                 self.data_logger.log_error("ATOMIC arbitrage trade execution failed", "ArbitrageEngine")
                 
                 # Track failed execution (might indicate system issues)
-                self.risk_controller.volume_tracker.activate_circuit_breaker(
+                self.volume_tracker.activate_circuit_breaker(
                     'execution_failure',
                     'Multiple trade execution failures detected',
                     None,
@@ -303,7 +439,7 @@ class ArbitrageEngine:
             self.data_logger.log_error(f"Opportunity execution error: {e}", "ArbitrageEngine", e)
             
             # Activate circuit breaker for system errors
-            self.risk_controller.volume_tracker.activate_circuit_breaker(
+            self.volume_tracker.activate_circuit_breaker(
                 'system_error',
                 f'System error in arbitrage execution: {e}',
                 None,
@@ -311,34 +447,35 @@ class ArbitrageEngine:
             )
     
     def _mark_opportunity_executed(self, opportunity):
-        """Mark opportunity as executed in database"""
-        try:
-            # Find the most recent matching opportunity
-            db_opportunity = ArbitrageOpportunity.query.filter(
-                ArbitrageOpportunity.usdt_price == opportunity['usdt_price'],
-                ArbitrageOpportunity.usdc_price == opportunity['usdc_price'],
-                ArbitrageOpportunity.executed == False
-            ).order_by(ArbitrageOpportunity.created_at.desc()).first()
-            
-            if db_opportunity:
-                db_opportunity.executed = True
-                db.session.commit()
-            
-        except Exception as e:
-            self.logger.error(f"Error marking opportunity as executed: {e}")
-            db.session.rollback()
+        """Queue opportunity to be marked as executed in database"""
+        self._enqueue_write('executed', opportunity)
     
     def get_engine_status(self):
-        """Get current engine status"""
+        """Get current engine status (cached briefly to absorb dashboard polling)"""
+        status, built_at = self._status_cache
+        if status is not None and time.monotonic() - built_at < self.STATUS_CACHE_TTL:
+            return status
+        
+        with self._status_lock:
+            # Another caller may have rebuilt it while we waited
+            status, built_at = self._status_cache
+            if status is not None and time.monotonic() - built_at < self.STATUS_CACHE_TTL:
+                return status
+            
+            status = self._build_engine_status()
+            if 'error' not in status:
+                self._status_cache = (status, time.monotonic())
+            return status
+    
+    def _build_engine_status(self):
+        """Collect engine status from all components"""
         try:
             config = self.config_manager.get_config()
             balances = self.balance_manager.get_balances()
             prices = self.price_monitor.get_current_prices()
             
             # Get recent performance
-            from core.profit_analyzer import ProfitAnalyzer
-            profit_analyzer = ProfitAnalyzer()
-            today_stats = profit_analyzer.get_today_stats()
+            today_stats = self.profit_analyzer.get_today_stats()
             
             status = {
                 'running': self.running,
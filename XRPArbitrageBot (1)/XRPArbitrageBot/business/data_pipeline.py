@@ -1,16 +1,22 @@
 import logging
+from collections import defaultdict
 from datetime import datetime, timedelta
-from sqlalchemy import func
+import numpy as np
+from sqlalchemy import func, case
 from app import db
 from models import Trade, PriceHistory, ArbitrageOpportunity, Balance
 from core.profit_analyzer import ProfitAnalyzer
+from core import arb_math
 
 class DataPipeline:
     """Data processing pipeline for trading analytics"""
     
+    MAX_PRICE_POINTS = 4096  # Per-pair cap on rows loaded for price statistics
+    
     def __init__(self):
         self.logger = logging.getLogger(__name__)
         self.profit_analyzer = ProfitAnalyzer()
+        self._balance_manager = None  # Created on first use; its constructor connects to the API
     
     def process_trading_data(self, time_range='24h'):
         """Process and aggregate trading data for analytics"""
@@ -61,9 +67,46 @@ class DataPipeline:
     def _aggregate_trades(self, cutoff_time):
         """Aggregate trade data for the specified time period"""
         try:
-            trades = Trade.query.filter(Trade.created_at >= cutoff_time).all()
+            hour = func.extract('hour', Trade.created_at)
+            rows = db.session.query(
+                hour,
+                Trade.pair,
+                Trade.status,
+                func.count(Trade.id),
+                func.sum(Trade.amount),
+                func.sum(func.coalesce(Trade.profit_loss, 0)),
+                func.sum(case((Trade.profit_loss > 0, 1), else_=0))
+            ).filter(
+                Trade.created_at >= cutoff_time
+            ).group_by(hour, Trade.pair, Trade.status).yield_per(2000)
+            
+            total_trades = 0
+            total_volume = 0.0
+            total_profit_loss = 0.0
+            profitable_trades = 0
+            status_counts = defaultdict(int)
+            hour_totals = defaultdict(lambda: [0, 0.0, 0.0])  # [count, volume, profit]
+            pair_totals = defaultdict(lambda: [0, 0.0, 0.0])
+            
+            # Stream the grouped rows into running totals
+            for trade_hour, pair, status, count, volume, profit, profitable in rows:
+                volume = volume or 0
+                profit = profit or 0
+                
+                total_trades += count
+                total_volume += volume
+                status_counts[status] += count
+                
+                if status == 'completed':
+                    total_profit_loss += profit
+                    profitable_trades += profitable or 0
+                
+                for totals in (hour_totals[int(trade_hour)], pair_totals[pair]):
+                    totals[0] += count
+                    totals[1] += volume
+                    totals[2] += profit
             
-            if not trades:
+            if not total_trades:
                 return {
                     'total_trades': 0,
                     'total_volume': 0.0,
@@ -74,35 +117,18 @@ class DataPipeline:
                     'trades_by_pair': {}
                 }
             
-            # Basic aggregations
-            total_trades = len(trades)
-            total_volume = sum(trade.amount for trade in trades)
-            completed_trades = [t for t in trades if t.status == 'completed']
-            total_profit_loss = sum(trade.profit_loss or 0 for trade in completed_trades)
+            trades_by_hour = {
+                hour_key: {'count': count, 'volume': volume, 'profit': profit}
+                for hour_key, (count, volume, profit) in hour_totals.items()
+            }
+            trades_by_pair = {
+                pair: {'count': count, 'volume': volume, 'profit': profit}
+                for pair, (count, volume, profit) in pair_totals.items()
+            }
             
+            completed_trades = status_counts.get('completed', 0)
             avg_trade_size = total_volume / total_trades if total_trades > 0 else 0
-            profitable_trades = len([t for t in completed_trades if (t.profit_loss or 0) > 0])
-            success_rate = (profitable_trades / len(completed_trades) * 100) if completed_trades else 0
-            
-            # Trades by hour
-            trades_by_hour = {}
-            for trade in trades:
-                hour = trade.created_at.hour
-                if hour not in trades_by_hour:
-                    trades_by_hour[hour] = {'count': 0, 'volume': 0, 'profit': 0}
-                trades_by_hour[hour]['count'] += 1
-                trades_by_hour[hour]['volume'] += trade.amount
-                trades_by_hour[hour]['profit'] += trade.profit_loss or 0
-            
-            # Trades by pair
-            trades_by_pair = {}
-            for trade in trades:
-                pair = trade.pair
-                if pair not in trades_by_pair:
-                    trades_by_pair[pair] = {'count': 0, 'volume': 0, 'profit': 0}
-                trades_by_pair[pair]['count'] += 1
-                trades_by_pair[pair]['volume'] += trade.amount
-                trades_by_pair[pair]['profit'] += trade.profit_loss or 0
+            success_rate = (profitable_trades / completed_trades * 100) if completed_trades else 0
             
             return {
                 'total_trades': total_trades,
@@ -112,9 +138,9 @@ class DataPipeline:
                 'success_rate': success_rate,
                 'trades_by_hour': trades_by_hour,
                 'trades_by_pair': trades_by_pair,
-                'completed_trades': len(completed_trades),
-                'pending_trades': len([t for t in trades if t.status == 'pending']),
-                'failed_trades': len([t for t in trades if t.status == 'failed'])
+                'completed_trades': completed_trades,
+                'pending_trades': status_counts.get('pending', 0),
+                'failed_trades': status_counts.get('failed', 0)
             }
             
         except Exception as e:
@@ -124,35 +150,45 @@ class DataPipeline:
     def _analyze_price_movements(self, cutoff_time):
         """Analyze price movements and volatility"""
         try:
-            # Get price history for both pairs
-            usdt_prices = PriceHistory.query.filter(
-                PriceHistory.pair == 'XRP/USDT',
-                PriceHistory.timestamp >= cutoff_time
-            ).order_by(PriceHistory.timestamp).all()
+            # Exact per-pair count and range in one aggregate; the loaded series may be subsampled
+            window_stats = {
+                pair: (count, min_price, max_price, avg_price)
+                for pair, count, min_price, max_price, avg_price in db.session.query(
+                    PriceHistory.pair,
+                    func.count(PriceHistory.id),
+                    func.min(PriceHistory.price),
+                    func.max(PriceHistory.price),
+                    func.avg(PriceHistory.price)
+                ).filter(
+                    PriceHistory.pair.in_(('XRP/USDT', 'XRP/USDC')),
+                    PriceHistory.timestamp >= cutoff_time
+                ).group_by(PriceHistory.pair).all()
+            }
             
-            usdc_prices = PriceHistory.query.filter(
-                PriceHistory.pair == 'XRP/USDC',
-                PriceHistory.timestamp >= cutoff_time
-            ).order_by(PriceHistory.timestamp).all()
+            # Subsample long windows with one stride for both pairs so they stay aligned
+            largest = max((stats[0] for stats in window_stats.values()), default=0)
+            stride = max(1, -(-largest // self.MAX_PRICE_POINTS))
             
-            analysis = {}
+            # Load the price column of both pairs straight into arrays
+            usdt_values = self._load_price_series('XRP/USDT', cutoff_time, stride)
+            usdc_values = self._load_price_series('XRP/USDC', cutoff_time, stride)
             
-            # Analyze USDT pair
-            if usdt_prices:
-                usdt_values = [p.price for p in usdt_prices]
-                analysis['XRP/USDT'] = self._calculate_price_stats(usdt_values)
-                analysis['XRP/USDT']['data_points'] = len(usdt_prices)
+            analysis = {}
             
-            # Analyze USDC pair
-            if usdc_prices:
-                usdc_values = [p.price for p in usdc_prices]
-                analysis['XRP/USDC'] = self._calculate_price_stats(usdc_values)
-                analysis['XRP/USDC']['data_points'] = len(usdc_prices)
+            # Analyze each pair; volatility and change come from the series, the range from SQL
+            for pair, values in (('XRP/USDT', usdt_values), ('XRP/USDC', usdc_values)):
+                if not values.size:
+                    continue
+                
+                count, min_price, max_price, avg_price = window_stats.get(pair, (0, 0, 0, 0))
+                pair_stats = self._calculate_price_stats(values)
+                if values.size >= 2:
+                    pair_stats.update(min=float(min_price), max=float(max_price), avg=float(avg_price))
+                pair_stats['data_points'] = count
+                analysis[pair] = pair_stats
             
             # Calculate correlation if both pairs have data
-            if usdt_prices and usdc_prices:
-                usdt_values = [p.price for p in usdt_prices] if 'usdt_values' not in locals() else usdt_values
-                usdc_values = [p.price for p in usdc_prices] if 'usdc_values' not in locals() else usdc_values
+            if usdt_values.size and usdc_values.size:
                 correlation = self._calculate_price_correlation(usdt_values, usdc_values)
                 analysis['correlation'] = correlation
             
@@ -162,34 +198,54 @@ class DataPipeline:
             self.logger.error(f"Error analyzing price movements: {e}")
             return {}
     
+    def _load_price_series(self, pair, cutoff_time, stride=1):
+        """Fetch every stride-th price of a pair since cutoff_time as a float64 array, oldest first"""
+        if stride == 1:
+            rows = db.session.query(PriceHistory.price).filter(
+                PriceHistory.pair == pair,
+                PriceHistory.timestamp >= cutoff_time
+            ).order_by(PriceHistory.timestamp).yield_per(5000)
+        else:
+            # Number rows in time order and keep every stride-th one plus the newest
+            numbered = db.session.query(
+                PriceHistory.price.label('price'),
+                PriceHistory.timestamp.label('timestamp'),
+                func.row_number().over(order_by=PriceHistory.timestamp).label('rn'),
+                func.count().over().label('total')
+            ).filter(
+                PriceHistory.pair == pair,
+                PriceHistory.timestamp >= cutoff_time
+            ).subquery()
+            
+            rows = db.session.query(numbered.c.price).filter(
+                ((numbered.c.rn - 1) % stride == 0) | (numbered.c.rn == numbered.c.total)
+            ).order_by(numbered.c.timestamp).yield_per(5000)
+        
+        return np.fromiter((row[0] for row in rows), dtype=np.float64)
+    
     def _calculate_price_stats(self, prices):
         """Calculate statistical measures for price data"""
-        if not prices or len(prices) < 2:
+        if prices is None or len(prices) < 2:
             return {
                 'min': 0, 'max': 0, 'avg': 0, 'volatility': 0,
                 'change': 0, 'change_percent': 0
             }
         
-        min_price = min(prices)
-        max_price = max(prices)
-        avg_price = sum(prices) / len(prices)
-        
-        # Calculate volatility (standard deviation)
-        variance = sum((p - avg_price) ** 2 for p in prices) / (len(prices) - 1)
-        volatility = variance ** 0.5
+        arr = np.asarray(prices, dtype=np.float64)
+        first, last = float(arr[0]), float(arr[-1])
         
         # Price change
-        price_change = prices[-1] - prices[0]
-        change_percent = (price_change / prices[0] * 100) if prices[0] > 0 else 0
+        price_change = last - first
+        change_percent = (price_change / first * 100) if first > 0 else 0
         
         return {
-            'min': min_price,
-            'max': max_price,
-            'avg': avg_price,
-            'volatility': volatility,
+            'min': float(arr.min()),
+            'max': float(arr.max()),
+            'avg': float(arr.mean()),
+            'volatility': float(arr.std(ddof=1)),  # Sample standard deviation
             'change': price_change,
             'change_percent': change_percent,
-            'current': prices[-1]
+            'current': last
         }
     
     def _calculate_price_correlation(self, prices1, prices2):
@@ -198,24 +254,14 @@ class DataPipeline:
             if len(prices1) != len(prices2) or len(prices1) < 2:
                 return 0
             
-            # Take the minimum length to ensure equal lengths
-            min_len = min(len(prices1), len(prices2))
-            p1 = prices1[:min_len]
-            p2 = prices2[:min_len]
-            
-            # Calculate means
-            mean1 = sum(p1) / len(p1)
-            mean2 = sum(p2) / len(p2)
-            
-            # Calculate correlation coefficient
-            numerator = sum((p1[i] - mean1) * (p2[i] - mean2) for i in range(len(p1)))
+            p1 = np.asarray(prices1, dtype=np.float64)
+            p2 = np.asarray(prices2, dtype=np.float64)
             
-            sum_sq1 = sum((p - mean1) ** 2 for p in p1)
-            sum_sq2 = sum((p - mean2) ** 2 for p in p2)
-            denominator = (sum_sq1 * sum_sq2) ** 0.5
+            # corrcoef is undefined for a flat series
+            if p1.std() == 0 or p2.std() == 0:
+                return 0
             
-            correlation = numerator / denominator if denominator > 0 else 0
-            return correlation
+            return float(np.corrcoef(p1, p2)[0, 1])
             
         except Exception as e:
             self.logger.error(f"Error calculating correlation: {e}")
@@ -224,11 +270,18 @@ class DataPipeline:
     def _calculate_spread_statistics(self, cutoff_time):
         """Calculate spread statistics and trends"""
         try:
-            opportunities = ArbitrageOpportunity.query.filter(
+            spread = ArbitrageOpportunity.spread_percentage
+            count, avg_spread, max_spread, min_spread, avg_sq_spread = db.session.query(
+                func.count(ArbitrageOpportunity.id),
+                func.avg(spread),
+                func.max(spread),
+                func.min(spread),
+                func.avg(spread * spread)
+            ).filter(
                 ArbitrageOpportunity.created_at >= cutoff_time
-            ).order_by(ArbitrageOpportunity.created_at).all()
+            ).one()
             
-            if not opportunities:
+            if not count:
                 return {
                     'avg_spread': 0,
                     'max_spread': 0,
@@ -237,20 +290,20 @@ class DataPipeline:
                     'spread_trend': 'neutral'
                 }
             
-            spreads = [opp.spread_percentage for opp in opportunities]
-            
-            avg_spread = sum(spreads) / len(spreads)
-            max_spread = max(spreads)
-            min_spread = min(spreads)
-            
-            # Calculate spread volatility
-            spread_variance = sum((s - avg_spread) ** 2 for s in spreads) / len(spreads)
+            # Calculate spread volatility (population variance = E[x^2] - E[x]^2)
+            spread_variance = max(avg_sq_spread - avg_spread ** 2, 0.0)
             spread_volatility = spread_variance ** 0.5
             
-            # Determine spread trend
-            if len(spreads) >= 5:
-                recent_avg = sum(spreads[-5:]) / 5
-                older_avg = sum(spreads[:5]) / 5
+            # Determine spread trend from the oldest and newest five spreads
+            if count >= 5:
+                window = db.session.query(spread).filter(
+                    ArbitrageOpportunity.created_at >= cutoff_time
+                )
+                older = window.order_by(ArbitrageOpportunity.created_at.asc()).limit(5).all()
+                recent = window.order_by(ArbitrageOpportunity.created_at.desc()).limit(5).all()
+                
+                recent_avg = sum(row[0] for row in recent) / 5
+                older_avg = sum(row[0] for row in older) / 5
                 
                 if recent_avg > older_avg * 1.1:
                     spread_trend = 'increasing'
@@ -267,7 +320,7 @@ class DataPipeline:
                 'min_spread': min_spread,
                 'spread_volatility': spread_volatility,
                 'spread_trend': spread_trend,
-                'total_opportunities': len(opportunities)
+                'total_opportunities': count
             }
             
         except Exception as e:
@@ -277,11 +330,15 @@ class DataPipeline:
     def _analyze_opportunities(self, cutoff_time):
         """Analyze arbitrage opportunities"""
         try:
-            opportunities = ArbitrageOpportunity.query.filter(
+            rows = db.session.query(
+                ArbitrageOpportunity.opportunity_type,
+                func.count(ArbitrageOpportunity.id),
+                func.sum(case((ArbitrageOpportunity.executed.is_(True), 1), else_=0))
+            ).filter(
                 ArbitrageOpportunity.created_at >= cutoff_time
-            ).all()
+            ).group_by(ArbitrageOpportunity.opportunity_type).all()
             
-            if not opportunities:
+            if not rows:
                 return {
                     'total_opportunities': 0,
                     'executed_opportunities': 0,
@@ -289,19 +346,15 @@ class DataPipeline:
                     'avg_opportunity_duration': 0
                 }
             
-            total_opportunities = len(opportunities)
-            executed_opportunities = len([o for o in opportunities if o.executed])
-            execution_rate = (executed_opportunities / total_opportunities * 100) if total_opportunities > 0 else 0
-            
             # Analyze opportunity types
-            opportunity_types = {}
-            for opp in opportunities:
-                opp_type = opp.opportunity_type
-                if opp_type not in opportunity_types:
-                    opportunity_types[opp_type] = {'count': 0, 'executed': 0}
-                opportunity_types[opp_type]['count'] += 1
-                if opp.executed:
-                    opportunity_types[opp_type]['executed'] += 1
+            opportunity_types = {
+                opp_type: {'count': count, 'executed': executed or 0}
+                for opp_type, count, executed in rows
+            }
+            
+            total_opportunities = sum(t['count'] for t in opportunity_types.values())
+            executed_opportunities = sum(t['executed'] for t in opportunity_types.values())
+            execution_rate = (executed_opportunities / total_opportunities * 100) if total_opportunities > 0 else 0
             
             return {
                 'total_opportunities': total_opportunities,
@@ -318,12 +371,12 @@ class DataPipeline:
     def _calculate_risk_metrics(self, cutoff_time):
         """Calculate risk metrics for the time period"""
         try:
-            trades = Trade.query.filter(
+            rows = db.session.query(Trade.profit_loss).filter(
                 Trade.created_at >= cutoff_time,
                 Trade.status == 'completed'
-            ).all()
+            ).order_by(Trade.created_at).all()
             
-            if not trades:
+            if not rows:
                 return {
                     'value_at_risk': 0,
                     'max_drawdown': 0,
@@ -331,37 +384,12 @@ class DataPipeline:
                 }
             
             # Calculate returns
-            returns = [trade.profit_loss or 0 for trade in trades]
-            
-            # Value at Risk (95% confidence)
-            if len(returns) >= 20:
-                sorted_returns = sorted(returns)
-                var_index = int(len(sorted_returns) * 0.05)  # 5th percentile
-                value_at_risk = abs(sorted_returns[var_index])
-            else:
-                value_at_risk = 0
-            
-            # Maximum drawdown calculation
-            cumulative_returns = []
-            running_total = 0
-            for ret in returns:
-                running_total += ret
-                cumulative_returns.append(running_total)
+            returns = np.fromiter((row[0] or 0 for row in rows), dtype=np.float64, count=len(rows))
             
-            peak = cumulative_returns[0] if cumulative_returns else 0
-            max_drawdown = 0
-            
-            for value in cumulative_returns:
-                if value > peak:
-                    peak = value
-                drawdown = peak - value
-                if drawdown > max_drawdown:
-                    max_drawdown = drawdown
+            # VaR (95% confidence), maximum drawdown, volatility and losses in one pass
+            value_at_risk, max_drawdown, volatility, avg_return, negative_count = arb_math.risk_metrics(returns)
             
             # Risk score (0-100, lower is better)
-            avg_return = sum(returns) / len(returns) if returns else 0
-            volatility = (sum((r - avg_return) ** 2 for r in returns) / len(returns)) ** 0.5 if returns else 0
-            
             if avg_return > 0 and volatility > 0:
                 sharpe_ratio = avg_return / volatility
                 risk_score = max(0, min(100, 50 - (sharpe_ratio * 10)))
@@ -369,11 +397,11 @@ class DataPipeline:
                 risk_score = 75  # High risk if no positive returns or no volatility data
             
             return {
-                'value_at_risk': value_at_risk,
-                'max_drawdown': max_drawdown,
+                'value_at_risk': float(value_at_risk),
+                'max_drawdown': float(max_drawdown),
                 'risk_score': risk_score,
-                'volatility': volatility,
-                'total_risk_events': len([r for r in returns if r < 0])
+                'volatility': float(volatility),
+                'total_risk_events': int(negative_count)
             }
             
         except Exception as e:
@@ -386,9 +414,10 @@ class DataPipeline:
             processed_data = self.process_trading_data(time_range)
             
             # Get current system status
-            from core.balance_manager import BalanceManager
-            balance_manager = BalanceManager()
-            current_balances = balance_manager.get_balance_summary()
+            if self._balance_manager is None:
+                from core.balance_manager import BalanceManager
+                self._balance_manager = BalanceManager()
+            current_balances = self._balance_manager.get_balance_summary()
             
             # Get profit analysis
             profit_stats = self.profit_analyzer.get_comprehensive_stats()
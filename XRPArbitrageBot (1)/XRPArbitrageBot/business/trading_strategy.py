@@ -1,15 +1,64 @@
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+import numpy as np
+from app import db
 from core.price_monitor import PriceMonitor
 from core.profit_analyzer import ProfitAnalyzer
 
+# Confidence weights for spread, volatility, success, timing and balance factors
+WEIGHTS = np.array([0.30, 0.25, 0.20, 0.15, 0.10])
+
+# Factor score lookup tables: score = SCORES[np.searchsorted(EDGES, value, side)]
+_SPREAD_MULT = np.array([1.0, 1.5, 2.0, 3.0])  # Spread as a multiple of the threshold
+_SPREAD_SCORES = np.array([0.0, 0.4, 0.6, 0.8, 1.0])
+_SPREAD_ASSESSMENTS = ("Spread too small", "Minimal spread", "Adequate spread",
+                       "Good spread", "Excellent spread")
+
+_VOL_EDGES = np.array([0.001, 0.005, 0.01, 0.02])
+_VOL_SCORES = np.array([1.0, 0.8, 0.6, 0.3, 0.1])
+_VOL_ASSESSMENTS = ("Very low volatility", "Low volatility", "Moderate volatility",
+                    "High volatility", "Very high volatility")
+
+_SUCCESS_EDGES = np.array([50.0, 60.0, 70.0, 80.0])
+_SUCCESS_SCORES = np.array([0.2, 0.4, 0.6, 0.8, 1.0])
+_SUCCESS_ASSESSMENTS = ("Very poor track record", "Poor track record", "Adequate track record",
+                        "Good track record", "Excellent track record")
+_SUCCESS_UNPROFITABLE_CAP = 2  # Without positive average profit the score tops out at 0.6
+
+_TIMING_EDGES = np.array([-0.1, 0.0, 0.1, 0.5])
+_TIMING_SCORES = np.array([0.2, 0.4, 0.6, 0.8, 1.0])
+_TIMING_ASSESSMENTS = ("Poor timing", "Neutral timing", "Positive timing",
+                       "Good timing", "Excellent timing")
+
+_BAL_EDGES = np.array([0.1, 0.2, 0.4, 0.6])
+_BAL_SCORES = np.array([1.0, 0.8, 0.6, 0.4, 0.2])
+_BAL_ASSESSMENTS = ("Excellent balance health", "Good balance health", "Adequate balance health",
+                    "Marginal balance health", "Poor balance health")
+
 class TradingStrategy:
     """Advanced trading decision logic"""
     
+    FACTOR_WORKERS = 2  # DB-bound factors evaluated off the calling thread
+    
     def __init__(self):
         self.logger = logging.getLogger(__name__)
-        self.price_monitor = PriceMonitor()
+        self.price_monitor = PriceMonitor.get_monitor()
         self.profit_analyzer = ProfitAnalyzer()
+        self._balance_manager = None  # Created on first use; its constructor connects to the API
+        # Threads start on first submit, so building the pool up front costs nothing
+        self._executor = ThreadPoolExecutor(max_workers=self.FACTOR_WORKERS,
+                                            thread_name_prefix='strategy-factor')
+    
+    def close(self):
+        """Shut down the factor thread pool; call when the owning engine stops"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+    
+    def _run_in_app_context(self, factor_fn, *args):
+        """Run a factor on a pool thread with its own app context and DB session"""
+        from app import app
+        with app.app_context():
+            return factor_fn(*args)
     
     def should_trade(self, opportunity, config, market_conditions=None):
         """
@@ -25,39 +74,46 @@ class TradingStrategy:
         """
         try:
             decision_factors = []
-            confidence_score = 0.0
+            
+            # Volatility and balance factors query the DB independently of the stats below
+            executor = self._executor
+            volatility_future = executor.submit(self._run_in_app_context, self._analyze_volatility_factor)
+            balance_future = executor.submit(self._run_in_app_context, self._analyze_balance_factor,
+                                             opportunity.amount)
+            
+            # Fetch historical stats once per decision; no 30-day trades means no 7-day trades either
+            stats_30d = self.profit_analyzer.get_comprehensive_stats(days=30)
+            if stats_30d['total_trades']:
+                stats_7d = self.profit_analyzer.get_comprehensive_stats(days=7)
+            else:
+                stats_7d = stats_30d
             
             # Factor 1: Spread size (30% weight)
-            spread_factor = self._analyze_spread_factor(opportunity, config)
-            decision_factors.append(spread_factor)
-            confidence_score += spread_factor['score'] * 0.3
+            decision_factors.append(self._analyze_spread_factor(opportunity, config))
             
             # Factor 2: Market volatility (25% weight)
-            volatility_factor = self._analyze_volatility_factor()
-            decision_factors.append(volatility_factor)
-            confidence_score += volatility_factor['score'] * 0.25
+            decision_factors.append(volatility_future.result())
             
             # Factor 3: Historical success rate (20% weight)
-            success_factor = self._analyze_success_factor()
-            decision_factors.append(success_factor)
-            confidence_score += success_factor['score'] * 0.2
+            decision_factors.append(self._analyze_success_factor(stats_7d))
             
             # Factor 4: Market timing (15% weight)
-            timing_factor = self._analyze_timing_factor()
-            decision_factors.append(timing_factor)
-            confidence_score += timing_factor['score'] * 0.15
+            decision_factors.append(self._analyze_timing_factor(stats_30d))
             
             # Factor 5: Balance health (10% weight)
-            balance_factor = self._analyze_balance_factor(opportunity['amount'])
-            decision_factors.append(balance_factor)
-            confidence_score += balance_factor['score'] * 0.1
+            decision_factors.append(balance_future.result())
+            
+            # Weighted confidence across all factors
+            scores = np.fromiter((f['score'] for f in decision_factors), dtype=np.float64, count=len(WEIGHTS))
+            confidence_score = float(scores @ WEIGHTS)
             
             # Make trading decision
             should_trade = confidence_score >= 0.6  # 60% confidence threshold
             
             # Compile decision reasoning
-            positive_factors = [f for f in decision_factors if f['score'] > 0.5]
-            negative_factors = [f for f in decision_factors if f['score'] <= 0.5]
+            positive_mask = scores > 0.5
+            positive_factors = [decision_factors[i] for i in np.nonzero(positive_mask)[0]]
+            negative_factors = [decision_factors[i] for i in np.nonzero(~positive_mask)[0]]
             
             reason_parts = []
             if positive_factors:
@@ -90,25 +146,14 @@ class TradingStrategy:
     def _analyze_spread_factor(self, opportunity, config):
         """Analyze spread attractiveness"""
         try:
-            spread_pct = opportunity['spread_percentage']
+            spread_pct = opportunity.spread_percentage
             threshold_pct = config.spread_threshold * 100
             
             # Score based on how much the spread exceeds the threshold
-            if spread_pct >= threshold_pct * 3:  # 3x threshold
-                score = 1.0
-                assessment = "Excellent spread"
-            elif spread_pct >= threshold_pct * 2:  # 2x threshold
-                score = 0.8
-                assessment = "Good spread"
-            elif spread_pct >= threshold_pct * 1.5:  # 1.5x threshold
-                score = 0.6
-                assessment = "Adequate spread"
-            elif spread_pct >= threshold_pct:  # Above threshold
-                score = 0.4
-                assessment = "Minimal spread"
-            else:
-                score = 0.0
-                assessment = "Spread too small"
+            spread_ratio = spread_pct / threshold_pct if threshold_pct > 0 else np.inf
+            idx = int(np.searchsorted(_SPREAD_MULT, spread_ratio, side='right'))
+            score = float(_SPREAD_SCORES[idx])
+            assessment = _SPREAD_ASSESSMENTS[idx]
             
             return {
                 'name': 'Spread Size',
@@ -130,12 +175,12 @@ class TradingStrategy:
             from models import PriceHistory
             recent_cutoff = datetime.utcnow() - timedelta(minutes=15)
             
-            recent_prices = PriceHistory.query.filter(
+            rows = db.session.query(PriceHistory.price).filter(
                 PriceHistory.timestamp >= recent_cutoff,
                 PriceHistory.pair == 'XRP/USDT'
             ).order_by(PriceHistory.timestamp).all()
             
-            if len(recent_prices) < 5:
+            if len(rows) < 5:
                 return {
                     'name': 'Market Volatility',
                     'score': 0.5,
@@ -143,29 +188,15 @@ class TradingStrategy:
                     'details': 'Not enough price history'
                 }
             
-            price_values = [p.price for p in recent_prices]
-            avg_price = sum(price_values) / len(price_values)
+            price_values = np.fromiter((row[0] for row in rows), dtype=np.float64, count=len(rows))
             
-            # Calculate volatility as standard deviation
-            variance = sum((p - avg_price) ** 2 for p in price_values) / len(price_values)
-            volatility = (variance ** 0.5) / avg_price
+            # Calculate volatility as standard deviation relative to the mean
+            volatility = float(price_values.std() / price_values.mean())
             
             # Score volatility (lower is better for arbitrage)
-            if volatility < 0.001:  # < 0.1%
-                score = 1.0
-                assessment = "Very low volatility"
-            elif volatility < 0.005:  # < 0.5%
-                score = 0.8
-                assessment = "Low volatility"
-            elif volatility < 0.01:  # < 1%
-                score = 0.6
-                assessment = "Moderate volatility"
-            elif volatility < 0.02:  # < 2%
-                score = 0.3
-                assessment = "High volatility"
-            else:
-                score = 0.1
-                assessment = "Very high volatility"
+            idx = int(np.searchsorted(_VOL_EDGES, volatility, side='right'))
+            score = float(_VOL_SCORES[idx])
+            assessment = _VOL_ASSESSMENTS[idx]
             
             return {
                 'name': 'Market Volatility',
@@ -178,11 +209,9 @@ class TradingStrategy:
             self.logger.error(f"Error analyzing volatility: {e}")
             return {'name': 'Market Volatility', 'score': 0.5, 'assessment': 'Analysis failed'}
     
-    def _analyze_success_factor(self):
-        """Analyze historical success rate"""
+    def _analyze_success_factor(self, stats):
+        """Analyze historical success rate from 7-day stats"""
         try:
-            stats = self.profit_analyzer.get_comprehensive_stats(days=7)
-            
             if stats['total_trades'] == 0:
                 return {
                     'name': 'Success Rate',
@@ -195,21 +224,11 @@ class TradingStrategy:
             avg_profit = stats['avg_profit_per_trade']
             
             # Score based on success rate and profitability
-            if success_rate >= 80 and avg_profit > 0:
-                score = 1.0
-                assessment = "Excellent track record"
-            elif success_rate >= 70 and avg_profit > 0:
-                score = 0.8
-                assessment = "Good track record"
-            elif success_rate >= 60:
-                score = 0.6
-                assessment = "Adequate track record"
-            elif success_rate >= 50:
-                score = 0.4
-                assessment = "Poor track record"
-            else:
-                score = 0.2
-                assessment = "Very poor track record"
+            idx = int(np.searchsorted(_SUCCESS_EDGES, success_rate, side='right'))
+            if avg_profit <= 0:
+                idx = min(idx, _SUCCESS_UNPROFITABLE_CAP)
+            score = float(_SUCCESS_SCORES[idx])
+            assessment = _SUCCESS_ASSESSMENTS[idx]
             
             return {
                 'name': 'Success Rate',
@@ -222,13 +241,12 @@ class TradingStrategy:
             self.logger.error(f"Error analyzing success factor: {e}")
             return {'name': 'Success Rate', 'score': 0.5, 'assessment': 'Analysis failed'}
     
-    def _analyze_timing_factor(self):
-        """Analyze market timing"""
+    def _analyze_timing_factor(self, stats):
+        """Analyze market timing from 30-day stats"""
         try:
             current_hour = datetime.utcnow().hour
             
             # Get historical performance by hour
-            stats = self.profit_analyzer.get_comprehensive_stats(days=30)
             time_analysis = stats.get('time_analysis', {})
             
             if 'hourly_performance' not in time_analysis:
@@ -243,27 +261,13 @@ class TradingStrategy:
                     score = 0.6
                     assessment = "Moderate activity hours"
             else:
-                hourly_perf = time_analysis['hourly_performance']
+                hour_profit = time_analysis['hourly_performance'].get(current_hour)
                 
-                if current_hour in hourly_perf:
-                    hour_profit = hourly_perf[current_hour]
-                    
+                if hour_profit is not None:
                     # Score based on historical performance this hour
-                    if hour_profit > 0.5:
-                        score = 1.0
-                        assessment = "Excellent timing"
-                    elif hour_profit > 0.1:
-                        score = 0.8
-                        assessment = "Good timing"
-                    elif hour_profit > 0:
-                        score = 0.6
-                        assessment = "Positive timing"
-                    elif hour_profit > -0.1:
-                        score = 0.4
-                        assessment = "Neutral timing"
-                    else:
-                        score = 0.2
-                        assessment = "Poor timing"
+                    idx = int(np.searchsorted(_TIMING_EDGES, hour_profit, side='left'))
+                    score = float(_TIMING_SCORES[idx])
+                    assessment = _TIMING_ASSESSMENTS[idx]
                 else:
                     score = 0.5
                     assessment = "No historical data"
@@ -279,22 +283,24 @@ class TradingStrategy:
             self.logger.error(f"Error analyzing timing factor: {e}")
             return {'name': 'Market Timing', 'score': 0.5, 'assessment': 'Analysis failed'}
     
+    def _get_balance_manager(self):
+        """Get the shared BalanceManager, creating it on first use"""
+        if self._balance_manager is None:
+            from core.balance_manager import BalanceManager
+            self._balance_manager = BalanceManager()
+        return self._balance_manager
+    
     def _analyze_balance_factor(self, trade_amount):
         """Analyze balance health for trading"""
         try:
-            from core.balance_manager import BalanceManager
-            balance_manager = BalanceManager()
-            
-            balances = balance_manager.get_balances()
+            balances = self._get_balance_manager().get_balances_view()
             
             # Check XRP balance sufficiency
-            xrp_balance = balances.get('XRP', {}).get('free', 0)
+            xrp_balance = balances.free_of('XRP')
             xrp_ratio = trade_amount / xrp_balance if xrp_balance > 0 else 1
             
             # Check stablecoin balance
-            usdt_balance = balances.get('USDT', {}).get('free', 0)
-            usdc_balance = balances.get('USDC', {}).get('free', 0)
-            total_stable = usdt_balance + usdc_balance
+            total_stable = balances.free_of('USDT', 'USDC')
             
             estimated_cost = trade_amount * 0.52  # Approximate XRP price
             stable_ratio = estimated_cost / total_stable if total_stable > 0 else 1
@@ -302,21 +308,9 @@ class TradingStrategy:
             # Score based on balance utilization
             max_ratio = max(xrp_ratio, stable_ratio)
             
-            if max_ratio < 0.1:  # Using < 10% of balance
-                score = 1.0
-                assessment = "Excellent balance health"
-            elif max_ratio < 0.2:  # Using < 20% of balance
-                score = 0.8
-                assessment = "Good balance health"
-            elif max_ratio < 0.4:  # Using < 40% of balance
-                score = 0.6
-                assessment = "Adequate balance health"
-            elif max_ratio < 0.6:  # Using < 60% of balance
-                score = 0.4
-                assessment = "Marginal balance health"
-            else:
-                score = 0.2
-                assessment = "Poor balance health"
+            idx = int(np.searchsorted(_BAL_EDGES, max_ratio, side='right'))
+            score = float(_BAL_SCORES[idx])
+            assessment = _BAL_ASSESSMENTS[idx]
             
             return {
                 'name': 'Balance Health',
@@ -336,7 +330,7 @@ class TradingStrategy:
             optimized_amount = base_amount
             
             # Adjust based on spread size
-            spread_pct = opportunity['spread_percentage']
+            spread_pct = opportunity.spread_percentage
             threshold_pct = config.spread_threshold * 100
             
             if spread_pct > threshold_pct * 2:
@@ -0,0 +1,4 @@
+import os
+
+# Tests run against a throwaway in-memory database, never xrp_trading.db
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
@@ -1,21 +1,72 @@
 import random
 import time
+import threading
 import logging
 from datetime import datetime
+import numpy as np
 
 class APIConnector:
     """MEXC exchange API connection simulator"""
     
+    _INSTANCE = None
+    _instance_lock = threading.Lock()
+    RNG_BUFFER_SIZE = 4096  # Random draws generated per batch
+    TICK_INTERVAL_MS = 1000  # Spacing of simulated ticks returned by get_tickers
+    
+    # Simulated base prices around which tickers vary
+    BASE_PRICES = {
+        'XRP/USDT': 0.5234,
+        'XRP/USDC': 0.5241
+    }
+    
+    # Simulated account balances returned by get_balance
+    BALANCE_TEMPLATE = {
+        'XRP': {'free': 10000.0, 'used': 100.0, 'total': 10100.0},
+        'USDT': {'free': 5000.0, 'used': 50.0, 'total': 5050.0},
+        'USDC': {'free': 5000.0, 'used': 50.0, 'total': 5050.0}
+    }
+    
+    @classmethod
+    def get_connector(cls):
+        """Get the process-wide connected APIConnector"""
+        if cls._INSTANCE is None:
+            with cls._instance_lock:
+                if cls._INSTANCE is None:
+                    connector = cls()
+                    connector.connect()
+                    cls._INSTANCE = connector
+        return cls._INSTANCE
+    
     def __init__(self):
         self.connected = False
         self.last_ping = None
         self.logger = logging.getLogger(__name__)
         
+        # Simulated market noise is drawn in batches and consumed one slot per call
+        self._rng = np.random.default_rng()
+        self._rng_lock = threading.Lock()
+        self._refill_draws()
+    
+    def _refill_draws(self):
+        """Generate the next batch of simulated price, volume and failure draws"""
+        n = self.RNG_BUFFER_SIZE
+        self._variation_buf = self._rng.uniform(-0.005, 0.005, n)
+        self._volume_buf = self._rng.uniform(1000000, 5000000, n)
+        self._failure_buf = self._rng.random(n) < 0.05  # 5% chance of order failure
+        self._draw_idx = 0
+    
+    def _next_draw(self):
+        """Reserve the next slot in the draw buffers"""
+        with self._rng_lock:
+            if self._draw_idx == self.RNG_BUFFER_SIZE:
+                self._refill_draws()
+            idx = self._draw_idx
+            self._draw_idx += 1
+            return idx
+    
     def connect(self):
         """Simulate API connection"""
         try:
-            # Simulate connection delay
-            time.sleep(0.5)
             self.connected = True
             self.last_ping = datetime.utcnow()
             self.logger.info("Connected to MEXC API (simulated)")
@@ -40,21 +91,19 @@ class APIConnector:
             raise Exception("API not connected")
         
         # Simulate realistic XRP prices with small variations
-        base_prices = {
-            'XRP/USDT': 0.5234,
-            'XRP/USDC': 0.5241
-        }
-        
-        if symbol not in base_prices:
+        try:
+            base_price = self.BASE_PRICES[symbol]
+        except KeyError:
             raise Exception(f"Symbol {symbol} not found")
         
-        base_price = base_prices[symbol]
+        idx = self._next_draw()
+        
         # Add small random variation (-0.5% to +0.5%)
-        variation = random.uniform(-0.005, 0.005)
+        variation = float(self._variation_buf[idx])
         current_price = base_price * (1 + variation)
         
         # Simulate volume
-        volume = random.uniform(1000000, 5000000)
+        volume = float(self._volume_buf[idx])
         
         ticker = {
             'symbol': symbol,
@@ -67,18 +116,47 @@ class APIConnector:
         
         return ticker
     
-    def get_balance(self):
-        """Get account balance"""
+    def get_tickers(self, symbol, n):
+        """
+        Generate n consecutive simulated ticks for a symbol in one batch
+        
+        Args:
+            symbol: Trading pair, e.g. 'XRP/USDT'
+            n: Number of ticks
+        
+        Returns:
+            dict: Arrays of length n keyed by 'last', 'bid', 'ask', 'volume' and 'timestamp'
+        """
         if not self.connected:
             raise Exception("API not connected")
         
-        # Simulate account balances
+        if symbol not in self.BASE_PRICES:
+            raise Exception(f"Symbol {symbol} not found")
+        
+        with self._rng_lock:
+            variations = self._rng.uniform(-0.005, 0.005, n)
+            volumes = self._rng.uniform(1000000, 5000000, n)
+        
+        prices = self.BASE_PRICES[symbol] * (1 + variations)
+        now_ms = int(datetime.utcnow().timestamp() * 1000)
+        
         return {
-            'XRP': {'free': 10000.0, 'used': 100.0, 'total': 10100.0},
-            'USDT': {'free': 5000.0, 'used': 50.0, 'total': 5050.0},
-            'USDC': {'free': 5000.0, 'used': 50.0, 'total': 5050.0}
+            'symbol': symbol,
+            'last': prices,
+            'bid': prices * 0.9995,
+            'ask': prices * 1.0005,
+            'volume': volumes,
+            'timestamp': np.arange(n, dtype=np.int64) * self.TICK_INTERVAL_MS + now_ms
         }
     
+    def get_balance(self):
+        """Get account balance"""
+        if not self.connected:
+            raise Exception("API not connected")
+        
+        # Simulate account balances; copied so callers can't mutate the template
+        return {currency: balance.copy() for currency, balance in self.BALANCE_TEMPLATE.items()}
+    
     def create_order(self, symbol, order_type, side, amount, price=None):
         """Create a trading order"""
         if not self.connected:
@@ -88,7 +166,7 @@ class APIConnector:
         order_id = f"sim_{int(time.time())}_{random.randint(1000, 9999)}"
         
         # Simulate small chance of order failure
-        if random.random() < 0.05:  # 5% chance of failure
+        if self._failure_buf[self._next_draw()]:  # 5% chance of failure
             raise Exception("Order creation failed (simulated)")
         
         order = {
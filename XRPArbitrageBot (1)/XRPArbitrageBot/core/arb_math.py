@@ -0,0 +1,141 @@
+import numpy as np
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:  # numba is optional; fall back to plain Python
+    NUMBA_AVAILABLE = False
+    
+    def njit(*args, **kwargs):
+        if args and callable(args[0]):
+            return args[0]
+        
+        def decorator(func):
+            return func
+        return decorator
+
+# evaluate() status codes
+OK = 0
+REJECT_SPREAD = 1
+REJECT_AMOUNT = 2
+REJECT_PROFIT = 3
+
+# evaluate() sides
+SELL_USDT_BUY_USDC = 0
+SELL_USDC_BUY_USDT = 1
+
+# Minimum sample size before a 95% value at risk is reported
+VAR_MIN_SAMPLES = 20
+
+@njit(cache=True, fastmath=True)
+def evaluate(usdt_price, usdc_price, trade_amount, max_safe_amount,
+             threshold_pct, fee_rate, min_profit, spread_mul_base, max_spread_mul):
+    """
+    Score a directional arbitrage between XRP/USDT and XRP/USDC
+    
+    Args:
+        usdt_price, usdc_price: Last prices of both pairs
+        trade_amount: Configured base trade amount
+        max_safe_amount: Upper bound from the risk controller
+        threshold_pct: Minimum spread in percent
+        fee_rate: Taker fee rate applied to both legs
+        min_profit: Minimum estimated net profit
+        spread_mul_base: Spread percentage that maps to a 1x trade amount
+        max_spread_mul: Cap on the spread-based trade amount multiplier
+    
+    Returns:
+        tuple: (status, side, spread, spread_percentage, sell_price, buy_price,
+                amount, gross_profit, estimated_fees, net_profit, spread_multiplier)
+    """
+    # Sell on the higher-priced pair, buy on the lower one
+    side = SELL_USDT_BUY_USDC if usdt_price > usdc_price else SELL_USDC_BUY_USDT
+    sell_price = max(usdt_price, usdc_price)
+    buy_price = min(usdt_price, usdc_price)
+    
+    spread = sell_price - buy_price
+    spread_percentage = spread / buy_price * 100
+    
+    if spread_percentage < threshold_pct:
+        return (REJECT_SPREAD, side, spread, spread_percentage, sell_price, buy_price,
+                0.0, 0.0, 0.0, 0.0, 0.0)
+    
+    # Larger spreads allow larger trades, up to max_spread_mul x the base amount
+    spread_multiplier = min(max_spread_mul, spread_percentage / spread_mul_base)
+    amount = min(trade_amount * spread_multiplier, max_safe_amount)
+    
+    if amount <= 0:
+        return (REJECT_AMOUNT, side, spread, spread_percentage, sell_price, buy_price,
+                amount, 0.0, 0.0, 0.0, spread_multiplier)
+    
+    fee_factor = (sell_price + buy_price) * fee_rate
+    gross_profit = amount * spread
+    estimated_fees = amount * fee_factor
+    net_profit = gross_profit - estimated_fees
+    
+    status = OK if net_profit >= min_profit else REJECT_PROFIT
+    return (status, side, spread, spread_percentage, sell_price, buy_price,
+            amount, gross_profit, estimated_fees, net_profit, spread_multiplier)
+
+@njit(cache=True, fastmath=True)
+def _risk_kernel(returns):
+    """Single pass over returns: Welford variance, running-peak drawdown and VaR"""
+    n = returns.size
+    run = 0.0
+    peak = returns[0]
+    max_drawdown = 0.0
+    mean = 0.0
+    m2 = 0.0
+    negative_count = 0
+    
+    for i in range(n):
+        x = returns[i]
+        run += x
+        if run > peak:
+            peak = run
+        if peak - run > max_drawdown:
+            max_drawdown = peak - run
+        
+        delta = x - mean
+        mean += delta / (i + 1)
+        m2 += delta * (x - mean)
+        
+        if x < 0:
+            negative_count += 1
+    
+    value_at_risk = 0.0
+    if n >= VAR_MIN_SAMPLES:
+        var_index = int(n * 0.05)  # 5th percentile
+        value_at_risk = abs(np.partition(returns, var_index)[var_index])
+    
+    return value_at_risk, max_drawdown, np.sqrt(m2 / n), mean, negative_count
+
+def _risk_numpy(returns):
+    """Vectorized equivalent of _risk_kernel for installs without numba"""
+    value_at_risk = 0.0
+    if returns.size >= VAR_MIN_SAMPLES:
+        var_index = int(returns.size * 0.05)  # 5th percentile
+        value_at_risk = float(abs(np.partition(returns, var_index)[var_index]))
+    
+    cumulative_returns = np.cumsum(returns)
+    max_drawdown = float((np.maximum.accumulate(cumulative_returns) - cumulative_returns).max())
+    
+    return (value_at_risk, max_drawdown, float(returns.std()), float(returns.mean()),
+            int((returns < 0).sum()))
+
+def risk_metrics(returns):
+    """
+    Compute risk figures for a non-empty series of trade returns
+    
+    Args:
+        returns: Contiguous float64 array of per-trade profit/loss in time order
+    
+    Returns:
+        tuple: (value_at_risk, max_drawdown, volatility, avg_return, negative_count)
+    """
+    if NUMBA_AVAILABLE:
+        return _risk_kernel(returns)
+    return _risk_numpy(returns)
+
+if NUMBA_AVAILABLE:
+    # Compile (or load from the on-disk cache) at import so the first report doesn't pay for it
+    _risk_kernel(np.zeros(VAR_MIN_SAMPLES))
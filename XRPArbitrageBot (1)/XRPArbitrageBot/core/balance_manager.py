@@ -1,17 +1,117 @@
+import time
 import logging
+import threading
+from contextlib import contextmanager
+from typing import NamedTuple
+import numpy as np
 from app import db
 from models import Balance
 from core.api_connector import APIConnector
+from core.price_monitor import PriceMonitor
+
+# Stand-in for a currency with no balance row; shared, never mutated
+_ZERO_BALANCE = {'free': 0.0, 'locked': 0.0, 'total': 0.0}
+
+class BalanceUpdateError(Exception):
+    """A balance mutation failed inside transaction(); the whole block was rolled back"""
+
+class BalancesView(NamedTuple):
+    """Free and locked balances packed into arrays, indexed by currency"""
+    currencies: tuple
+    free: np.ndarray
+    locked: np.ndarray
+    idx: dict
+    
+    def free_of(self, *currencies):
+        """Total free balance across currencies; missing currencies count as zero"""
+        positions = [self.idx[c] for c in currencies if c in self.idx]
+        return float(self.free[positions].sum())
+    
+    @property
+    def as_dict(self):
+        """Balances in the {currency: {'free', 'locked', 'total'}} form"""
+        return {
+            currency: {
+                'free': float(free),
+                'locked': float(locked),
+                'total': float(free + locked)
+            }
+            for currency, free, locked in zip(self.currencies, self.free, self.locked)
+        }
 
 class BalanceManager:
     """Wallet balance management and stablecoin rebalancing"""
     
+    CACHE_TTL = 1.0  # Seconds a loaded set of Balance rows is reused
+    
     def __init__(self):
-        self.api = APIConnector()
+        self.api = APIConnector.get_connector()
         self.logger = logging.getLogger(__name__)
+        self._cache: dict[str, Balance] = {}
+        self._cache_at: float = 0.0
+        self._tx = threading.local()  # Per-thread transaction() nesting state
+    
+    def _get_row(self, currency):
+        """Get the Balance row for a currency, reloading all rows in one query when stale"""
+        row = self._cache.get(currency)
+        if row is None or time.monotonic() - self._cache_at >= self.CACHE_TTL or row not in db.session:
+            # Rows from another thread's session or a finished app context can't be reused
+            self._cache = {b.currency: b for b in Balance.query.all()}
+            self._cache_at = time.monotonic()
+            row = self._cache.get(currency)
+        return row
+    
+    def _invalidate_cache(self):
+        """Force the next _get_row call to reload balances"""
+        self._cache_at = 0.0
+    
+    @contextmanager
+    def transaction(self):
+        """
+        Group balance mutations into a single commit
+        
+        Inside the block, balance methods flush instead of committing. The
+        outermost block commits once on exit, or rolls back if the block raised
+        or any balance mutation failed; a failed mutation raises
+        BalanceUpdateError so callers don't carry on as if it was saved.
+        """
+        if getattr(self._tx, 'depth', 0):
+            self._tx.depth += 1
+            try:
+                yield
+            finally:
+                self._tx.depth -= 1
+            return
         
-        # Connect to API
-        self.api.connect()
+        self._tx.depth = 1
+        self._tx.failed = False
+        try:
+            yield
+            if self._tx.failed:
+                raise BalanceUpdateError("Balance transaction rolled back after a failed update")
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        finally:
+            self._tx.depth = 0
+            self._invalidate_cache()
+    
+    def _commit(self):
+        """Commit balance changes, or only flush them inside transaction()"""
+        if getattr(self._tx, 'depth', 0):
+            db.session.flush()
+        else:
+            db.session.commit()
+            self._invalidate_cache()
+    
+    def _rollback(self):
+        """Roll back a failed balance change, or fail the enclosing transaction() which rolls back once"""
+        if getattr(self._tx, 'depth', 0):
+            self._tx.failed = True
+        else:
+            db.session.rollback()
+            self._invalidate_cache()
     
     def initialize_balances(self):
         """Initialize balances if they don't exist"""
@@ -32,40 +132,44 @@ class BalanceManager:
                 db.session.add(balance)
             
             db.session.commit()
+            self._invalidate_cache()
             self.logger.info("Initialized default balances")
             
         except Exception as e:
             self.logger.error(f"Error initializing balances: {e}")
             db.session.rollback()
+            self._invalidate_cache()
     
-    def get_balances(self):
-        """Get current balances"""
+    def get_balances_view(self):
+        """Get current balances as a BalancesView"""
         try:
-            balances = {}
-            db_balances = Balance.query.all()
-            
-            for balance in db_balances:
-                balances[balance.currency] = {
-                    'free': balance.amount,
-                    'locked': balance.locked,
-                    'total': balance.amount + balance.locked
-                }
+            rows = db.session.query(Balance.currency, Balance.amount, Balance.locked).all()
             
             # If no balances in DB, initialize and get from API simulation
-            if not balances:
+            if not rows:
                 self.initialize_balances()
-                return self.get_balances()
-            
-            return balances
+                rows = db.session.query(Balance.currency, Balance.amount, Balance.locked).all()
+            
+            currencies = tuple(row[0] for row in rows)
+            return BalancesView(
+                currencies=currencies,
+                free=np.fromiter((row[1] for row in rows), dtype=np.float64, count=len(rows)),
+                locked=np.fromiter((row[2] for row in rows), dtype=np.float64, count=len(rows)),
+                idx={currency: i for i, currency in enumerate(currencies)}
+            )
             
         except Exception as e:
             self.logger.error(f"Error getting balances: {e}")
-            return {}
+            return BalancesView((), np.zeros(0), np.zeros(0), {})
+    
+    def get_balances(self):
+        """Get current balances"""
+        return self.get_balances_view().as_dict
     
     def update_balance(self, currency, amount_change, lock_change=0):
         """Update balance for a currency"""
         try:
-            balance = Balance.query.filter_by(currency=currency).first()
+            balance = self._get_row(currency)
             if not balance:
                 balance = Balance(currency=currency, amount=0.0, locked=0.0)
                 db.session.add(balance)
@@ -79,17 +183,42 @@ class BalanceManager:
             if balance.locked < 0:
                 balance.locked = 0
             
-            db.session.commit()
+            self._commit()
             self.logger.info(f"Updated {currency} balance: {amount_change:+.4f}")
             
         except Exception as e:
             self.logger.error(f"Error updating balance: {e}")
-            db.session.rollback()
+            self._rollback()
+    
+    def update_balances(self, changes):
+        """
+        Apply several balance changes in a single transaction
+        
+        Args:
+            changes: Dict of currency -> amount change
+        """
+        try:
+            for currency, amount_change in changes.items():
+                balance = self._get_row(currency)
+                if not balance:
+                    balance = Balance(currency=currency, amount=0.0, locked=0.0)
+                    db.session.add(balance)
+                
+                # Ensure no negative balances
+                balance.amount = max(0, balance.amount + amount_change)
+            
+            self._commit()
+            self.logger.info("Updated balances: " + ", ".join(
+                f"{currency} {amount_change:+.4f}" for currency, amount_change in changes.items()))
+            
+        except Exception as e:
+            self.logger.error(f"Error updating balances: {e}")
+            self._rollback()
     
     def lock_balance(self, currency, amount):
         """Lock balance for pending trades"""
         try:
-            balance = Balance.query.filter_by(currency=currency).first()
+            balance = self._get_row(currency)
             if not balance:
                 raise Exception(f"No balance found for {currency}")
             
@@ -99,18 +228,18 @@ class BalanceManager:
             balance.amount -= amount
             balance.locked += amount
             
-            db.session.commit()
+            self._commit()
             self.logger.info(f"Locked {amount:.4f} {currency}")
             
         except Exception as e:
             self.logger.error(f"Error locking balance: {e}")
-            db.session.rollback()
+            self._rollback()
             raise
     
     def unlock_balance(self, currency, amount):
         """Unlock balance after trade completion"""
         try:
-            balance = Balance.query.filter_by(currency=currency).first()
+            balance = self._get_row(currency)
             if not balance:
                 raise Exception(f"No balance found for {currency}")
             
@@ -121,17 +250,17 @@ class BalanceManager:
             balance.locked -= amount
             balance.amount += amount
             
-            db.session.commit()
+            self._commit()
             self.logger.info(f"Unlocked {amount:.4f} {currency}")
             
         except Exception as e:
             self.logger.error(f"Error unlocking balance: {e}")
-            db.session.rollback()
+            self._rollback()
     
     def check_sufficient_balance(self, currency, required_amount, safety_buffer=0.1):
         """Check if there's sufficient balance for a trade"""
         try:
-            balance = Balance.query.filter_by(currency=currency).first()
+            balance = self._get_row(currency)
             if not balance:
                 return False
             
@@ -170,13 +299,11 @@ class BalanceManager:
             if abs(usdt_diff) / total_stable > 0.05:
                 if usdt_diff > 0:
                     # Need more USDT, convert USDC to USDT
-                    self.update_balance('USDC', -abs(usdt_diff))
-                    self.update_balance('USDT', abs(usdt_diff))
+                    self.update_balances({'USDC': -abs(usdt_diff), 'USDT': abs(usdt_diff)})
                     self.logger.info(f"Rebalanced: Converted {abs(usdt_diff):.2f} USDC to USDT")
                 else:
                     # Need more USDC, convert USDT to USDC
-                    self.update_balance('USDT', -abs(usdc_diff))
-                    self.update_balance('USDC', abs(usdc_diff))
+                    self.update_balances({'USDT': -abs(usdc_diff), 'USDC': abs(usdc_diff)})
                     self.logger.info(f"Rebalanced: Converted {abs(usdc_diff):.2f} USDT to USDC")
             
         except Exception as e:
@@ -188,29 +315,25 @@ class BalanceManager:
             balances = self.get_balances()
             
             # Calculate USD equivalents (assuming XRP price)
-            from core.price_monitor import PriceMonitor
-            price_monitor = PriceMonitor()
-            prices = price_monitor.get_current_prices()
+            prices = PriceMonitor.get_monitor().get_current_prices()
             
             xrp_price = 0.52  # Default fallback
             if 'XRP/USDT' in prices:
                 xrp_price = prices['XRP/USDT']['price']
             
+            xrp_usd_value = balances.get('XRP', _ZERO_BALANCE)['total'] * xrp_price
+            stable_total = (balances.get('USDT', _ZERO_BALANCE)['total'] +
+                            balances.get('USDC', _ZERO_BALANCE)['total'])
+            
             summary = {
                 'balances': balances,
                 'totals': {
-                    'xrp_usd_value': balances.get('XRP', {}).get('total', 0) * xrp_price,
-                    'stable_total': (balances.get('USDT', {}).get('total', 0) + 
-                                   balances.get('USDC', {}).get('total', 0)),
-                    'portfolio_total': 0
+                    'xrp_usd_value': xrp_usd_value,
+                    'stable_total': stable_total,
+                    'portfolio_total': xrp_usd_value + stable_total
                 }
             }
             
-            summary['totals']['portfolio_total'] = (
-                summary['totals']['xrp_usd_value'] + 
-                summary['totals']['stable_total']
-            )
-            
             return summary
             
         except Exception as e:
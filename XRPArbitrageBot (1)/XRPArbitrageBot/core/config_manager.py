@@ -1,50 +1,83 @@
 import logging
+import threading
+import time
+from sqlalchemy import select
 from app import db
 from models import TradingConfig
 
+# Built once so every lookup reuses the same statement and its compiled form
+_CONFIG_STMT = select(TradingConfig).limit(1)
+
 class ConfigManager:
     """Configuration management for trading system"""
     
+    # Config changes on the order of minutes, so reads are served from a
+    # process-wide cache shared by every ConfigManager instance
+    CACHE_TTL = 30  # seconds
+    _cache_lock = threading.Lock()
+    _cached_config = None
+    _cache_expires_at = 0.0
+    _cached_dict = (None, None)  # (config object, its serialized dict)
+    
     def __init__(self):
         self.logger = logging.getLogger(__name__)
         self._ensure_default_config()
     
     def _ensure_default_config(self):
-        """Ensure default configuration exists"""
+        """Ensure default configuration exists and return it"""
         try:
-            config = TradingConfig.query.first()
+            config = db.session.scalars(_CONFIG_STMT).first()
             if not config:
-                default_config = TradingConfig(
+                config = TradingConfig(
                     spread_threshold=0.003,
                     trade_amount=100.0,
                     daily_max_volume=5000.0,
                     risk_buffer=0.1,
                     max_pending_orders=3
                 )
-                db.session.add(default_config)
+                db.session.add(config)
                 db.session.commit()
+                # Reload the expired attributes so callers can detach it safely
+                db.session.refresh(config)
                 self.logger.info("Created default trading configuration")
+            return config
         except Exception as e:
             self.logger.error(f"Error ensuring default config: {e}")
             db.session.rollback()
+            return None
     
     def get_config(self):
-        """Get current trading configuration"""
+        """Get current trading configuration (cached for CACHE_TTL seconds)"""
+        cls = ConfigManager
+        with cls._cache_lock:
+            if cls._cached_config is not None and time.monotonic() < cls._cache_expires_at:
+                return cls._cached_config
+        
         try:
-            config = TradingConfig.query.first()
-            if not config:
-                self._ensure_default_config()
-                config = TradingConfig.query.first()
+            config = self._ensure_default_config()
+            if config:
+                # Detach so later commits don't expire the cached attributes
+                db.session.expunge(config)
+                with cls._cache_lock:
+                    cls._cached_config = config
+                    cls._cache_expires_at = time.monotonic() + cls.CACHE_TTL
             
             return config
         except Exception as e:
             self.logger.error(f"Error getting config: {e}")
             return None
     
+    def invalidate(self):
+        """Drop the cached configuration so the next read hits the database"""
+        cls = ConfigManager
+        with cls._cache_lock:
+            cls._cached_config = None
+            cls._cache_expires_at = 0.0
+    
     def update_config(self, config_data):
         """Update trading configuration"""
         try:
-            config = TradingConfig.query.first()
+            config = db.session.scalars(_CONFIG_STMT).first()
             if not config:
                 config = TradingConfig()
                 db.session.add(config)
@@ -66,6 +99,7 @@ class ConfigManager:
                 config.max_pending_orders = int(config_data['max_pending_orders'])
             
             db.session.commit()
+            self.invalidate()
             self.logger.info("Configuration updated successfully")
             
             return config
@@ -82,14 +116,20 @@ class ConfigManager:
             if not config:
                 return {}
             
-            return {
-                'spread_threshold': config.spread_threshold,
-                'trade_amount': config.trade_amount,
-                'daily_max_volume': config.daily_max_volume,
-                'risk_buffer': config.risk_buffer,
-                'max_pending_orders': config.max_pending_orders,
-                'updated_at': config.updated_at.isoformat() if config.updated_at else None
-            }
+            # Serialize once per cached config object
+            source, config_dict = ConfigManager._cached_dict
+            if source is not config:
+                config_dict = {
+                    'spread_threshold': config.spread_threshold,
+                    'trade_amount': config.trade_amount,
+                    'daily_max_volume': config.daily_max_volume,
+                    'risk_buffer': config.risk_buffer,
+                    'max_pending_orders': config.max_pending_orders,
+                    'updated_at': config.updated_at.isoformat() if config.updated_at else None
+                }
+                ConfigManager._cached_dict = (config, config_dict)
+            
+            return dict(config_dict)
             
         except Exception as e:
             self.logger.error(f"Error getting config dict: {e}")
@@ -150,11 +190,12 @@ class ConfigManager:
     def reset_to_defaults(self):
         """Reset configuration to default values"""
         try:
-            config = TradingConfig.query.first()
+            config = db.session.scalars(_CONFIG_STMT).first()
             if config:
                 db.session.delete(config)
             
             self._ensure_default_config()
+            self.invalidate()
             self.logger.info("Configuration reset to defaults")
             
             return self.get_config()
@@ -1,24 +1,46 @@
+import os
+import atexit
+import queue
 import logging
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from collections import deque
 from datetime import datetime, timedelta
+from sqlalchemy import insert
 from app import db
 from models import SystemLog, Trade
 
+# File logging is configured once per process so extra DataLogger instances don't
+# stack handlers; records are handed to a listener thread so callers never wait on disk
+_LOGGER = logging.getLogger(__name__)
+_file_handler = RotatingFileHandler('trading_system.log', maxBytes=10 * 1024 * 1024, backupCount=5)
+_file_handler.setLevel(logging.INFO)
+_file_handler.setFormatter(logging.Formatter(
+    '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+))
+_log_queue = queue.Queue(-1)
+_LOGGER.addHandler(QueueHandler(_log_queue))
+_listener = QueueListener(_log_queue, _file_handler, respect_handler_level=True)
+_listener.start()
+atexit.register(_listener.stop)
+
 class DataLogger:
     """Transaction logging and history management"""
     
+    BATCH_SIZE = int(os.environ.get("LOG_DB_BATCH_SIZE", "1024"))  # Buffered rows that trigger an early flush
+    FLUSH_INTERVAL = 2.0  # Seconds between background flushes
+    
     def __init__(self):
-        self.logger = logging.getLogger(__name__)
-        
-        # Configure file logging
-        file_handler = logging.FileHandler('trading_system.log')
-        file_handler.setLevel(logging.INFO)
-        
-        formatter = logging.Formatter(
-            '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-        )
-        file_handler.setFormatter(formatter)
+        self.logger = _LOGGER
         
-        self.logger.addHandler(file_handler)
+        # SystemLog rows are buffered as mappings and inserted in batches by a background thread
+        self._buffer = deque()
+        self._buffer_lock = threading.Lock()
+        self._flush_evt = threading.Event()
+        self._engine = None
+        self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+        self._flusher.start()
+        atexit.register(self.flush)
     
     def log_trade(self, trade_data, trade_type='info'):
         """Log trade information"""
@@ -27,13 +49,7 @@ class DataLogger:
             self.logger.info(message)
             
             # Store in database
-            log_entry = SystemLog(
-                level='INFO',
-                message=message,
-                module='TradeLogger'
-            )
-            db.session.add(log_entry)
-            db.session.commit()
+            self._record('INFO', message, 'TradeLogger')
             
         except Exception as e:
             self.logger.error(f"Error logging trade: {e}")
@@ -42,19 +58,13 @@ class DataLogger:
         """Log arbitrage opportunity"""
         try:
             message = (f"Arbitrage opportunity detected - "
-                      f"Spread: {opportunity.get('spread_percentage', 0):.4f}%, "
-                      f"USDT: {opportunity.get('usdt_price', 0):.4f}, "
-                      f"USDC: {opportunity.get('usdc_price', 0):.4f}")
+                      f"Spread: {opportunity.spread_percentage:.4f}%, "
+                      f"USDT: {opportunity.usdt_price:.4f}, "
+                      f"USDC: {opportunity.usdc_price:.4f}")
             
             self.logger.info(message)
             
-            log_entry = SystemLog(
-                level='INFO',
-                message=message,
-                module='ArbitrageEngine'
-            )
-            db.session.add(log_entry)
-            db.session.commit()
+            self._record('INFO', message, 'ArbitrageEngine')
             
         except Exception as e:
             self.logger.error(f"Error logging arbitrage opportunity: {e}")
@@ -69,13 +79,7 @@ class DataLogger:
             
             self.logger.info(message)
             
-            log_entry = SystemLog(
-                level='INFO',
-                message=message,
-                module='BalanceManager'
-            )
-            db.session.add(log_entry)
-            db.session.commit()
+            self._record('INFO', message, 'BalanceManager')
             
         except Exception as e:
             self.logger.error(f"Error logging balance change: {e}")
@@ -92,13 +96,7 @@ class DataLogger:
             else:
                 self.logger.info(message)
             
-            log_entry = SystemLog(
-                level=severity,
-                message=message,
-                module='RiskController'
-            )
-            db.session.add(log_entry)
-            db.session.commit()
+            self._record(severity, message, 'RiskController')
             
         except Exception as e:
             self.logger.error(f"Error logging risk event: {e}")
@@ -109,13 +107,7 @@ class DataLogger:
             message = f"{event_type}: {details}"
             self.logger.info(message)
             
-            log_entry = SystemLog(
-                level='INFO',
-                message=message,
-                module=module
-            )
-            db.session.add(log_entry)
-            db.session.commit()
+            self._record('INFO', message, module)
             
         except Exception as e:
             self.logger.error(f"Error logging system event: {e}")
@@ -130,17 +122,53 @@ class DataLogger:
             
             self.logger.error(message)
             
-            log_entry = SystemLog(
-                level='ERROR',
-                message=message,
-                module=module
-            )
-            db.session.add(log_entry)
-            db.session.commit()
+            self._record('ERROR', message, module)
             
         except Exception as e:
             self.logger.error(f"Error logging error: {e}")
     
+    def _record(self, level, message, module):
+        """Buffer a SystemLog row for the next batched flush"""
+        self._buffer.append({
+            'level': level,
+            'message': message,
+            'module': module,
+            'timestamp': datetime.utcnow()
+        })
+        if len(self._buffer) >= self.BATCH_SIZE:
+            self._flush_evt.set()
+    
+    def _flush_loop(self):
+        """Flush buffered log rows every FLUSH_INTERVAL or once a batch fills up"""
+        from app import app
+        with app.app_context():
+            self._engine = db.engine
+        
+        while True:
+            self._flush_evt.wait(self.FLUSH_INTERVAL)
+            self._flush_evt.clear()
+            self.flush()
+    
+    def flush(self):
+        """Write all buffered log rows in one transaction"""
+        if self._engine is None:
+            return
+        
+        with self._buffer_lock:
+            entries = []
+            while self._buffer:
+                entries.append(self._buffer.popleft())
+            
+            if not entries:
+                return
+            
+            try:
+                # Core executemany on a dedicated connection: log rows are write-only, so skip the ORM
+                with self._engine.begin() as conn:
+                    conn.execute(insert(SystemLog), entries)
+            except Exception as e:
+                self.logger.error(f"Error flushing {len(entries)} log entries: {e}")
+    
     def get_recent_logs(self, limit=100, level=None):
         """Get recent system logs"""
         try:
@@ -167,10 +195,13 @@ class DataLogger:
         """Get trade history"""
         try:
             cutoff_date = datetime.utcnow() - timedelta(days=days)
-            query = Trade.query.filter(Trade.created_at >= cutoff_date)
+            query = Trade.query.with_entities(
+                Trade.id, Trade.trade_type, Trade.pair, Trade.amount, Trade.price,
+                Trade.total_value, Trade.profit_loss, Trade.status, Trade.created_at, Trade.completed_at
+            ).filter(Trade.created_at >= cutoff_date)
             
             if status:
-                query = query.filter_by(status=status)
+                query = query.filter(Trade.status == status)
             
             trades = query.order_by(Trade.created_at.desc()).all()
             
@@ -196,10 +227,10 @@ class DataLogger:
         try:
             cutoff_date = datetime.utcnow() - timedelta(days=days_to_keep)
             
-            # Delete old system logs
-            old_logs = SystemLog.query.filter(SystemLog.timestamp < cutoff_date)
-            deleted_count = old_logs.count()
-            old_logs.delete()
+            # Delete old system logs in one statement; rowcount gives the number removed
+            deleted_count = SystemLog.query.filter(
+                SystemLog.timestamp < cutoff_date
+            ).delete(synchronize_session=False)
             
             db.session.commit()
             
@@ -212,21 +243,21 @@ class DataLogger:
             return 0
     
     def export_trade_history(self, start_date=None, end_date=None):
-        """Export trade history for analysis"""
+        """Export trade history for analysis, yielding one dict per trade"""
         try:
-            query = Trade.query
+            query = Trade.query.with_entities(
+                Trade.created_at, Trade.trade_type, Trade.pair, Trade.amount, Trade.price,
+                Trade.total_value, Trade.profit_loss, Trade.status, Trade.order_id
+            )
             
             if start_date:
                 query = query.filter(Trade.created_at >= start_date)
             if end_date:
                 query = query.filter(Trade.created_at <= end_date)
             
-            trades = query.order_by(Trade.created_at).all()
-            
-            # Prepare data for export
-            export_data = []
-            for trade in trades:
-                export_data.append({
+            # Stream rows in batches instead of loading the whole range
+            for trade in query.order_by(Trade.created_at).yield_per(1000):
+                yield {
                     'timestamp': trade.created_at.isoformat(),
                     'type': trade.trade_type,
                     'pair': trade.pair,
@@ -236,10 +267,7 @@ class DataLogger:
                     'profit_loss': trade.profit_loss or 0,
                     'status': trade.status,
                     'order_id': trade.order_id
-                })
-            
-            return export_data
+                }
             
         except Exception as e:
             self.logger.error(f"Error exporting trade history: {e}")
-            return []
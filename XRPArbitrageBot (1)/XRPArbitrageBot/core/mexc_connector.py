@@ -1,16 +1,64 @@
 import os
 import time
+import asyncio
 import hmac
 import hashlib
+import bisect
 import requests
 import logging
+import threading
+from collections import deque
 from datetime import datetime
+from decimal import Decimal, ROUND_DOWN
+from enum import IntEnum
+from functools import lru_cache
+from urllib.parse import urlencode
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from cryptography.fernet import Fernet
 from core.api_connector import APIConnector
 
+try:
+    from orjson import loads as _json_loads
+except ImportError:  # orjson is optional; fall back to the stdlib parser
+    from json import loads as _json_loads
+
+class RLCat(IntEnum):
+    """MEXC rate limit categories, usable as tuple/list indexes"""
+    ORDER = 0
+    MARKET = 1
+    GENERAL = 2
+
+@lru_cache(maxsize=256)
+def _rate_limit_category(endpoint):
+    """Map an API endpoint to its rate limit category"""
+    if '/order' in endpoint:
+        return RLCat.ORDER
+    elif '/ticker' in endpoint or '/depth' in endpoint:
+        return RLCat.MARKET
+    return RLCat.GENERAL
+
 class MEXCConnector(APIConnector):
     """MEXC Exchange-specific API connector with advanced features"""
     
+    _INSTANCE = None  # Separate from APIConnector's so get_connector() returns a MEXCConnector
+    
+    # Order quantity/price steps per symbol; floats are quantized to these before
+    # sending so the exchange never sees repr noise like 100.00000000000001
+    QUANTITY_STEP = {
+        'XRP/USDT': Decimal('0.000001'),
+        'XRP/USDC': Decimal('0.000001')
+    }
+    PRICE_STEP = {
+        'XRP/USDT': Decimal('0.00001'),
+        'XRP/USDC': Decimal('0.00001')
+    }
+    DEFAULT_STEP = Decimal('0.000001')
+    
+    BALANCE_TTL = 3.0  # Seconds an account balance response is reused
+    TRACKED_ASSETS = ('XRP', 'USDT', 'USDC')  # Only these balances are parsed from /account
+    MARKET_DATA_TTL = 1.0  # Seconds a 24h ticker response is reused per symbol
+    
     def __init__(self):
         super().__init__()
         self.base_url = 'https://api.mexc.com'
@@ -18,12 +66,12 @@ class MEXCConnector(APIConnector):
         self.exchange_name = 'MEXC'
         self.logger = logging.getLogger(__name__)
         
-        # MEXC-specific configuration
-        self.rate_limits = {
-            'orders': 20,  # Orders per second
-            'general': 10,  # General API calls per second
-            'market_data': 50  # Market data calls per second
-        }
+        # MEXC-specific configuration, requests per second indexed by RLCat
+        self.rate_limits = (
+            20,  # ORDER
+            50,  # MARKET
+            10   # GENERAL
+        )
         
         self.trading_fees = {
             'maker': 0.0002,  # 0.02%
@@ -36,7 +84,20 @@ class MEXCConnector(APIConnector):
         
         # Rate limiting
         self._last_request_time = {}
-        self._request_counts = {}
+        self._request_counts = [deque() for _ in RLCat]
+        self._rate_limit_lock = threading.Lock()  # Requests run on several threads via the *_async helpers
+        
+        # Response caches as (time.monotonic() expiry, value); only live responses are cached
+        self._balance_cache = (0.0, None)
+        self._market_data_cache = {}
+        
+        # Keep-alive HTTP session so requests reuse pooled TCP/TLS connections
+        self._session = requests.Session()
+        self._session.mount('https://', HTTPAdapter(
+            pool_connections=10,
+            pool_maxsize=50,
+            max_retries=Retry(total=2, backoff_factor=0.1)
+        ))
         
     def _load_encrypted_credentials(self):
         """Load encrypted API credentials"""
@@ -61,6 +122,13 @@ class MEXCConnector(APIConnector):
             self.logger.error(f"Error loading MEXC credentials: {e}")
             self.api_key = 'demo_key'
             self.api_secret = 'demo_secret'
+        
+        # Derive the HMAC key schedule once; each request signs on a copy
+        self._hmac_template = hmac.new(self.api_secret.encode(), digestmod=hashlib.sha256)
+        self._auth_headers = {
+            'X-MEXC-APIKEY': self.api_key,
+            'Content-Type': 'application/json'
+        }
     
     def connect(self):
         """Connect to MEXC API with enhanced validation"""
@@ -101,34 +169,37 @@ class MEXCConnector(APIConnector):
             self.logger.error(f"Error testing MEXC authentication: {e}")
     
     def _make_authenticated_request(self, method, endpoint, params=None):
-        """Make authenticated request with MEXC signature"""
+        """
+        Make authenticated request with MEXC signature
+        
+        Args:
+            params: Dict of request parameters, or a list of (key, value)
+                tuples already sorted by key to skip the sort
+        """
         try:
             if not params:
-                params = {}
+                params = []
+            elif isinstance(params, dict):
+                params = sorted(params.items())
+            else:
+                params = list(params)
             
-            # Add timestamp
+            # Add timestamp, keeping the parameters sorted
             timestamp = int(time.time() * 1000)
-            params['timestamp'] = timestamp
+            bisect.insort(params, ('timestamp', timestamp))
             
             # Create query string
-            query_string = '&'.join([f"{key}={value}" for key, value in sorted(params.items())])
+            query_string = urlencode(params)
             
             # Create signature
-            signature = hmac.new(
-                self.api_secret.encode(),
-                query_string.encode(),
-                hashlib.sha256
-            ).hexdigest()
+            mac = self._hmac_template.copy()
+            mac.update(query_string.encode('ascii'))
+            signature = mac.hexdigest()
             
+            params = dict(params)
             params['signature'] = signature
             
-            # Add API key to headers
-            headers = {
-                'X-MEXC-APIKEY': self.api_key,
-                'Content-Type': 'application/json'
-            }
-            
-            return self._make_request(method, endpoint, params, headers)
+            return self._make_request(method, endpoint, params, self._auth_headers)
             
         except Exception as e:
             self.logger.error(f"Error making authenticated MEXC request: {e}")
@@ -138,20 +209,23 @@ class MEXCConnector(APIConnector):
         """Make rate-limited request to MEXC API"""
         try:
             # Apply rate limiting
-            if not self._check_rate_limit(endpoint):
+            category = _rate_limit_category(endpoint)
+            if not self._check_rate_limit(category):
                 time.sleep(0.1)  # Brief pause if rate limited
             
             url = f"{self.base_url}{endpoint}"
             
             if method == 'GET':
-                response = requests.get(url, params=params, headers=headers, timeout=10)
+                response = self._session.get(url, params=params, headers=headers, timeout=10)
             elif method == 'POST':
-                response = requests.post(url, json=params, headers=headers, timeout=10)
+                response = self._session.post(url, json=params, headers=headers, timeout=10)
+            elif method == 'DELETE':
+                response = self._session.delete(url, params=params, headers=headers, timeout=10)
             else:
                 raise ValueError(f"Unsupported HTTP method: {method}")
             
             # Update rate limiting counters
-            self._update_rate_limit_counters(endpoint)
+            self._update_rate_limit_counters(category)
             
             return response
             
@@ -159,49 +233,30 @@ class MEXCConnector(APIConnector):
             self.logger.error(f"MEXC API request error: {e}")
             raise
     
-    def _check_rate_limit(self, endpoint):
-        """Check if request would exceed rate limits"""
-        current_time = time.time()
-        
-        # Determine rate limit category
-        if '/order' in endpoint:
-            category = 'orders'
-        elif '/ticker' in endpoint or '/depth' in endpoint:
-            category = 'market_data'
-        else:
-            category = 'general'
-        
+    def _check_rate_limit(self, category):
+        """Check if a request in the given RLCat would exceed rate limits"""
+        current_time = time.monotonic()
         limit = self.rate_limits[category]
         
-        # Check if we have recent requests in this category
-        if category not in self._request_counts:
-            self._request_counts[category] = []
-        
-        # Remove old requests (older than 1 second)
-        self._request_counts[category] = [
-            req_time for req_time in self._request_counts[category]
-            if current_time - req_time < 1.0
-        ]
-        
-        # Check if we're under the limit
-        return len(self._request_counts[category]) < limit
+        with self._rate_limit_lock:
+            # Drop requests older than 1 second from the front of the window
+            window = self._request_counts[category]
+            while window and current_time - window[0] >= 1.0:
+                window.popleft()
+            
+            # Check if we're under the limit
+            return len(window) < limit
     
-    def _update_rate_limit_counters(self, endpoint):
+    def _update_rate_limit_counters(self, category):
         """Update rate limiting counters"""
-        current_time = time.time()
-        
-        # Determine category
-        if '/order' in endpoint:
-            category = 'orders'
-        elif '/ticker' in endpoint or '/depth' in endpoint:
-            category = 'market_data'
-        else:
-            category = 'general'
-        
-        if category not in self._request_counts:
-            self._request_counts[category] = []
-        
-        self._request_counts[category].append(current_time)
+        with self._rate_limit_lock:
+            self._request_counts[category].append(time.monotonic())
+    
+    @staticmethod
+    def _format_decimal(value, step):
+        """Render a float quantized down to the given step as a plain decimal string"""
+        # Start from the shortest repr so 0.5123 isn't truncated to 0.51229
+        return format(Decimal(repr(float(value))).quantize(step, rounding=ROUND_DOWN), 'f')
     
     def create_order(self, symbol, order_type, side, amount, price=None):
         """Create order with MEXC-specific parameters"""
@@ -209,21 +264,23 @@ class MEXCConnector(APIConnector):
             if not self.authenticated:
                 return self._simulate_order(symbol, order_type, side, amount, price)
             
-            params = {
-                'symbol': symbol.replace('/', ''),  # MEXC format: XRPUSDT
-                'side': side.upper(),
-                'type': order_type.upper(),
-                'quantity': str(amount),
-                'timeInForce': 'IOC'  # Immediate or Cancel for arbitrage
-            }
+            # Pre-sorted by key for signing
+            params = [
+                ('quantity', self._format_decimal(amount, self.QUANTITY_STEP.get(symbol, self.DEFAULT_STEP))),
+                ('side', side.upper()),
+                ('symbol', symbol.replace('/', '')),  # MEXC format: XRPUSDT
+                ('timeInForce', 'IOC'),  # Immediate or Cancel for arbitrage
+                ('type', order_type.upper())
+            ]
             
             if price:
-                params['price'] = str(price)
+                params.insert(0, ('price', self._format_decimal(price, self.PRICE_STEP.get(symbol, self.DEFAULT_STEP))))
             
             response = self._make_authenticated_request('POST', '/api/v3/order', params)
             
             if response and response.status_code == 200:
-                order_data = response.json()
+                order_data = _json_loads(response.content)
+                self._balance_cache = (0.0, None)  # Funds are now locked differently
                 return {
                     'id': order_data.get('orderId'),
                     'symbol': symbol,
@@ -247,15 +304,16 @@ class MEXCConnector(APIConnector):
             if not self.authenticated:
                 return self._simulate_order_status(order_id)
             
-            params = {
-                'symbol': symbol.replace('/', ''),
-                'orderId': order_id
-            }
+            # Pre-sorted by key for signing
+            params = [
+                ('orderId', order_id),
+                ('symbol', symbol.replace('/', ''))
+            ]
             
             response = self._make_authenticated_request('GET', '/api/v3/order', params)
             
             if response and response.status_code == 200:
-                order_data = response.json()
+                order_data = _json_loads(response.content)
                 return {
                     'id': order_data.get('orderId'),
                     'status': self._map_mexc_status(order_data.get('status')),
@@ -287,28 +345,36 @@ class MEXCConnector(APIConnector):
             if not self.authenticated:
                 return True  # Simulate success in demo mode
             
-            params = {
-                'symbol': symbol.replace('/', ''),
-                'orderId': order_id
-            }
+            # Pre-sorted by key for signing
+            params = [
+                ('orderId', order_id),
+                ('symbol', symbol.replace('/', ''))
+            ]
             
             response = self._make_authenticated_request('DELETE', '/api/v3/order', params)
             
-            return response and response.status_code == 200
+            if response and response.status_code == 200:
+                self._balance_cache = (0.0, None)
+                return True
+            return False
             
         except Exception as e:
             self.logger.error(f"Error cancelling MEXC order: {e}")
             return False
     
     def get_market_data(self, symbol):
-        """Get real-time market data from MEXC"""
+        """Get real-time market data from MEXC (cached for MARKET_DATA_TTL seconds)"""
+        expires_at, cached = self._market_data_cache.get(symbol, (0.0, None))
+        if cached is not None and time.monotonic() < expires_at:
+            return cached
+        
         try:
             mexc_symbol = symbol.replace('/', '')
             response = self._make_request('GET', f'/api/v3/ticker/24hr', {'symbol': mexc_symbol})
             
             if response and response.status_code == 200:
-                data = response.json()
-                return {
+                data = _json_loads(response.content)
+                market_data = {
                     'symbol': symbol,
                     'price': float(data.get('lastPrice', 0)),
                     'volume': float(data.get('volume', 0)),
@@ -317,6 +383,8 @@ class MEXCConnector(APIConnector):
                     'change': float(data.get('priceChangePercent', 0)),
                     'timestamp': datetime.utcnow().isoformat()
                 }
+                self._market_data_cache[symbol] = (time.monotonic() + self.MARKET_DATA_TTL, market_data)
+                return market_data
             else:
                 return self._simulate_market_data(symbol)
                 
@@ -324,20 +392,61 @@ class MEXCConnector(APIConnector):
             self.logger.error(f"Error getting MEXC market data: {e}")
             return self._simulate_market_data(symbol)
     
+    async def get_market_data_async(self, symbol):
+        """Awaitable get_market_data; the blocking request runs on a worker thread"""
+        return await asyncio.to_thread(self.get_market_data, symbol)
+    
+    async def get_order_status_async(self, order_id, symbol):
+        """Awaitable get_order_status; the blocking request runs on a worker thread"""
+        return await asyncio.to_thread(self.get_order_status, order_id, symbol)
+    
+    async def create_order_async(self, symbol, order_type, side, amount, price=None):
+        """Awaitable create_order; the blocking request runs on a worker thread"""
+        return await asyncio.to_thread(self.create_order, symbol, order_type, side, amount, price)
+    
+    def get_market_data_many(self, symbols):
+        """
+        Fetch market data for several symbols concurrently from synchronous code
+        
+        Async callers should gather get_market_data_async instead; this starts its
+        own event loop and so can't be called while one is running on the thread.
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            pass
+        else:
+            raise RuntimeError("get_market_data_many called from a running event loop; "
+                               "await get_market_data_async instead")
+        
+        async def fetch_all():
+            return await asyncio.gather(*(self.get_market_data_async(symbol) for symbol in symbols))
+        
+        return dict(zip(symbols, asyncio.run(fetch_all())))
+    
     def get_account_balance(self):
-        """Get account balance from MEXC"""
+        """Get account balance from MEXC (cached for BALANCE_TTL seconds)"""
         try:
             if not self.authenticated:
                 return self._simulate_balances()
             
+            expires_at, cached = self._balance_cache
+            if cached is not None and time.monotonic() < expires_at:
+                return cached
+            
             response = self._make_authenticated_request('GET', '/api/v3/account')
             
             if response and response.status_code == 200:
-                account_data = response.json()
+                account_data = _json_loads(response.content)
                 balances = {}
                 
-                for balance in account_data.get('balances', []):
-                    asset = balance.get('asset')
+                # The account lists every asset; index it once and parse only the ones we trade
+                by_asset = {b.get('asset'): b for b in account_data.get('balances', [])}
+                for asset in self.TRACKED_ASSETS:
+                    balance = by_asset.get(asset)
+                    if not balance:
+                        continue
+                    
                     free = float(balance.get('free', 0))
                     locked = float(balance.get('locked', 0))
                     
@@ -348,6 +457,7 @@ class MEXCConnector(APIConnector):
                             'total': free + locked
                         }
                 
+                self._balance_cache = (time.monotonic() + self.BALANCE_TTL, balances)
                 return balances
             else:
                 return self._simulate_balances()
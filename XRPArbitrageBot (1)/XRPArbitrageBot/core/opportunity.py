@@ -0,0 +1,22 @@
+from dataclasses import dataclass
+
+@dataclass(slots=True)
+class Opportunity:
+    """Detected arbitrage opportunity passed from detection through execution"""
+    usdt_price: float
+    usdc_price: float
+    spread: float
+    spread_percentage: float
+    opportunity_type: str
+    sell_pair: str
+    buy_pair: str
+    sell_price: float
+    buy_price: float
+    amount: float
+    estimated_profit: float
+    gross_profit: float
+    estimated_fees: float
+    volume_usdt: float
+    volume_usdc: float
+    spread_multiplier: float
+    db_id: int = 0  # ArbitrageOpportunity.id once persisted
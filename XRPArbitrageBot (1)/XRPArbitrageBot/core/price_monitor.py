@@ -1,24 +1,107 @@
 import time
+import queue
 import threading
 import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime
+from sqlalchemy import insert
 from app import db
 from models import PriceHistory
 from core.api_connector import APIConnector
 
+class RollingRange:
+    """Time-windowed min/max/avg over a price stream, updated in O(1) amortized per sample
+    
+    Written by the monitor thread only; readers call stats() without locking.
+    """
+    
+    def __init__(self, window):
+        self.window = window  # Seconds of samples kept
+        self._samples = deque()  # (monotonic time, price) in arrival order
+        self._max = deque()  # Decreasing prices, the window max at [0]
+        self._min = deque()  # Increasing prices, the window min at [0]
+        self._sum = 0.0
+    
+    def push(self, ts, price):
+        """Add a sample and drop those that fell out of the window"""
+        self._samples.append((ts, price))
+        self._sum += price
+        
+        while self._max and self._max[-1][1] <= price:
+            self._max.pop()
+        self._max.append((ts, price))
+        
+        while self._min and self._min[-1][1] >= price:
+            self._min.pop()
+        self._min.append((ts, price))
+        
+        cutoff = ts - self.window
+        while self._samples[0][0] < cutoff:
+            self._sum -= self._samples.popleft()[1]
+        while self._max[0][0] < cutoff:
+            self._max.popleft()
+        while self._min[0][0] < cutoff:
+            self._min.popleft()
+    
+    def stats(self):
+        """Get (min, max, avg, count) of the window, or None while it is empty"""
+        try:
+            count = len(self._samples)
+            return self._min[0][1], self._max[0][1], self._sum / count, count
+        except (IndexError, ZeroDivisionError):
+            return None
+
 class PriceMonitor:
     """Real-time XRP price monitoring"""
     
+    PRICE_TTL = 0.5  # Seconds a fetched quote is reused while the monitor loop isn't running
+    FETCH_TIMEOUT = 1.5  # Seconds to wait for both tickers before skipping the cycle
+    PRIME_TIMEOUT = 3.0  # Seconds a reader waits for the running monitor's first tick
+    HISTORY_BATCH_SIZE = 1000  # Buffered PriceHistory rows that force a flush
+    HISTORY_FLUSH_INTERVAL = 30.0  # Seconds between PriceHistory flushes
+    HISTORY_SAMPLE_INTERVAL = 10.0  # Seconds between PriceHistory samples
+    RECENT_WINDOW = 150  # Per-pair (monotonic time, price) samples kept in memory, ~5 minutes at 2s
+    RANGE_WINDOW = 1800.0  # Seconds covered by the per-pair rolling price ranges
+    _INSTANCE = None
+    _instance_lock = threading.Lock()
+    
+    @classmethod
+    def get_monitor(cls):
+        """Get the process-wide PriceMonitor"""
+        if cls._INSTANCE is None:
+            with cls._instance_lock:
+                if cls._INSTANCE is None:
+                    cls._INSTANCE = cls()
+        return cls._INSTANCE
+    
     def __init__(self):
-        self.api = APIConnector()
+        self.api = APIConnector.get_connector()
         self.running = False
         self.thread = None
         self.current_prices = {}
         self.last_update = None
+        self.current_spread = 0.0  # |USDT - USDC| last price, set with each snapshot
+        self.current_spread_pct = 0.0  # current_spread as a percentage of the USDT price
+        self._published_at = 0.0  # time.monotonic() of the last snapshot
+        self.tick_event = threading.Event()  # Set whenever a new quote arrives
+        self._primed = threading.Event()  # Set once the first snapshot is published
+        self._stop_event = threading.Event()  # Set by stop_monitoring to wake the loop immediately
+        self.ticks = deque(maxlen=256)  # Recent snapshots; single producer, appends are atomic
+        self.recent_prices = {
+            'XRP/USDT': deque(maxlen=self.RECENT_WINDOW),
+            'XRP/USDC': deque(maxlen=self.RECENT_WINDOW)
+        }
+        self.price_ranges = {
+            'XRP/USDT': RollingRange(self.RANGE_WINDOW),
+            'XRP/USDC': RollingRange(self.RANGE_WINDOW)
+        }
+        self._write_queue = queue.SimpleQueue()  # PriceHistory mappings for the writer thread; None stops it
+        self._writer = None
         self.logger = logging.getLogger(__name__)
         
-        # Connect to API
-        self.api.connect()
+        # One worker per pair so both ticker requests are in flight at once
+        self._fetch_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='price-fetch')
     
     def start_monitoring(self):
         """Start price monitoring in background thread"""
@@ -26,129 +109,191 @@ class PriceMonitor:
             return
         
         self.running = True
+        self._stop_event.clear()
         self.thread = threading.Thread(target=self._monitor_loop)
         self.thread.daemon = True
         self.thread.start()
+        
+        # History inserts run on their own thread so DB latency never delays a tick
+        self._writer = threading.Thread(target=self._writer_loop, daemon=True)
+        self._writer.start()
         self.logger.info("Price monitoring started")
     
     def stop_monitoring(self):
         """Stop price monitoring"""
+        if not self.running:
+            return
+        
         self.running = False
+        self._stop_event.set()
+        
+        # Bounded joins so a hung fetch or flush can't wedge shutdown
         if self.thread:
-            self.thread.join()
+            self.thread.join(timeout=10)
+        if self._writer:
+            self._write_queue.put(None)
+            self._writer.join(timeout=10)
+            self._writer = None  # The sentinel is consumed; a restart gets a fresh writer
         self.logger.info("Price monitoring stopped")
     
     def _monitor_loop(self):
         """Main monitoring loop"""
+        next_store_at = time.monotonic() + self.HISTORY_SAMPLE_INTERVAL
         while self.running:
             try:
                 # Get current prices
-                usdt_ticker = self.api.get_ticker('XRP/USDT')
-                usdc_ticker = self.api.get_ticker('XRP/USDC')
+                usdt_ticker, usdc_ticker = self._fetch_tickers()
                 
                 # Update current prices
-                self.current_prices = {
-                    'XRP/USDT': {
-                        'price': usdt_ticker['last'],
-                        'bid': usdt_ticker['bid'],
-                        'ask': usdt_ticker['ask'],
-                        'volume': usdt_ticker['volume'],
-                        'timestamp': datetime.utcnow()
-                    },
-                    'XRP/USDC': {
-                        'price': usdc_ticker['last'],
-                        'bid': usdc_ticker['bid'],
-                        'ask': usdc_ticker['ask'],
-                        'volume': usdc_ticker['volume'],
-                        'timestamp': datetime.utcnow()
-                    }
-                }
+                self._publish_tick(usdt_ticker, usdc_ticker)
                 
-                self.last_update = datetime.utcnow()
+                # Rolling windows are fed here only, so they keep a single writer
+                self.ingest_price('XRP/USDT', usdt_ticker['last'], self._published_at)
+                self.ingest_price('XRP/USDC', usdc_ticker['last'], self._published_at)
                 
-                # Store in database every 10th update (reduce storage)
-                if int(time.time()) % 10 == 0:
-                    self._store_price_history()
+                # Wake up consumers waiting on a fresh tick
+                self.tick_event.set()
                 
-                # Calculate and log spread
-                spread = abs(usdt_ticker['last'] - usdc_ticker['last'])
-                spread_percentage = (spread / usdt_ticker['last']) * 100
+                # Sample into the history buffer every HISTORY_SAMPLE_INTERVAL (reduce storage)
+                now = time.monotonic()
+                if now >= next_store_at:
+                    self._store_price_history()
+                    next_store_at = now + self.HISTORY_SAMPLE_INTERVAL
                 
-                if spread_percentage > 0.1:  # Log significant spreads
-                    self.logger.info(f"Spread detected: {spread_percentage:.4f}% "
+                # Log significant spreads (computed when the tick was published)
+                if self.current_spread_pct > 0.1:
+                    self.logger.info(f"Spread detected: {self.current_spread_pct:.4f}% "
                                    f"(USDT: {usdt_ticker['last']:.4f}, "
                                    f"USDC: {usdc_ticker['last']:.4f})")
                 
             except Exception as e:
                 self.logger.error(f"Error in price monitoring: {e}")
             
-            # Update every 2 seconds
-            time.sleep(2)
+            # Update every 2 seconds, returning at once if stopped
+            if self._stop_event.wait(2):
+                break
+    
+    def _fetch_tickers(self):
+        """Fetch XRP/USDT and XRP/USDC tickers concurrently"""
+        usdt_future = self._fetch_pool.submit(self.api.get_ticker, 'XRP/USDT')
+        usdc_future = self._fetch_pool.submit(self.api.get_ticker, 'XRP/USDC')
+        
+        _, pending = wait((usdt_future, usdc_future), timeout=self.FETCH_TIMEOUT)
+        if pending:
+            raise TimeoutError(f"Ticker fetch exceeded {self.FETCH_TIMEOUT}s")
+        
+        return usdt_future.result(), usdc_future.result()
+    
+    def _publish_tick(self, usdt_ticker, usdc_ticker):
+        """Publish a new price snapshot to current_prices and the tick buffer"""
+        now = datetime.utcnow()
+        snapshot = {
+            'XRP/USDT': {
+                'price': usdt_ticker['last'],
+                'bid': usdt_ticker['bid'],
+                'ask': usdt_ticker['ask'],
+                'volume': usdt_ticker['volume'],
+                'timestamp': now
+            },
+            'XRP/USDC': {
+                'price': usdc_ticker['last'],
+                'bid': usdc_ticker['bid'],
+                'ask': usdc_ticker['ask'],
+                'volume': usdc_ticker['volume'],
+                'timestamp': now
+            }
+        }
+        
+        self.current_spread = abs(usdt_ticker['last'] - usdc_ticker['last'])
+        self.current_spread_pct = self.current_spread / usdt_ticker['last'] * 100
+        self.current_prices = snapshot
+        self.last_update = now
+        self._published_at = time.monotonic()
+        self.ticks.append(snapshot)
+        self._primed.set()
+    
+    def ingest_price(self, pair, price, ts):
+        """Feed a price into the pair's recent window and rolling range (monitor thread only)"""
+        self.recent_prices[pair].append((ts, price))
+        self.price_ranges[pair].push(ts, price)
+    
+    def latest_tick(self):
+        """Get the most recent price snapshot without locking (None before the first tick)"""
+        try:
+            return self.ticks[-1]
+        except IndexError:
+            return None
     
     def _store_price_history(self):
-        """Store current prices in database"""
+        """Queue current prices as PriceHistory rows for the writer thread"""
+        for pair, data in self.current_prices.items():
+            self._write_queue.put({
+                'pair': pair,
+                'price': data['price'],
+                'volume': data['volume'],
+                'timestamp': data['timestamp']
+            })
+    
+    def _writer_loop(self):
+        """Drain queued PriceHistory rows, inserting a batch when full or every HISTORY_FLUSH_INTERVAL"""
+        rows = []
+        flush_at = time.monotonic() + self.HISTORY_FLUSH_INTERVAL
+        while True:
+            try:
+                row = self._write_queue.get(timeout=max(0.0, flush_at - time.monotonic()))
+            except queue.Empty:
+                pass
+            else:
+                if row is None:
+                    self._flush_price_history(rows)
+                    return
+                rows.append(row)
+            
+            if len(rows) >= self.HISTORY_BATCH_SIZE or time.monotonic() >= flush_at:
+                self._flush_price_history(rows)
+                rows = []
+                flush_at = time.monotonic() + self.HISTORY_FLUSH_INTERVAL
+    
+    def _flush_price_history(self, rows):
+        """Insert PriceHistory rows in a single transaction"""
+        if not rows:
+            return
+        
         try:
             from app import app
             with app.app_context():
-                for pair, data in self.current_prices.items():
-                    price_history = PriceHistory(
-                        pair=pair,
-                        price=data['price'],
-                        volume=data['volume']
-                    )
-                    db.session.add(price_history)
-                
-                db.session.commit()
-        except Exception as e:
-            self.logger.error(f"Error storing price history: {e}")
-            try:
-                from app import app
-                with app.app_context():
+                try:
+                    db.session.execute(insert(PriceHistory), rows)
+                    db.session.commit()
+                except Exception:
                     db.session.rollback()
-            except:
-                pass
+                    raise
+        except Exception as e:
+            self.logger.error(f"Error storing {len(rows)} price history rows: {e}")
     
     def get_current_prices(self):
         """Get current prices"""
-        if not self.current_prices:
-            # If no prices yet, get initial prices
+        if self.running:
+            # The monitor loop keeps prices fresh; only wait out its first fetch
+            self._primed.wait(self.PRIME_TIMEOUT)
+        elif not self.current_prices or time.monotonic() - self._published_at > self.PRICE_TTL:
+            # No monitor loop in this process, so fetch on the caller's thread
             try:
-                usdt_ticker = self.api.get_ticker('XRP/USDT')
-                usdc_ticker = self.api.get_ticker('XRP/USDC')
+                usdt_ticker, usdc_ticker = self._fetch_tickers()
                 
-                self.current_prices = {
-                    'XRP/USDT': {
-                        'price': usdt_ticker['last'],
-                        'bid': usdt_ticker['bid'],
-                        'ask': usdt_ticker['ask'],
-                        'volume': usdt_ticker['volume'],
-                        'timestamp': datetime.utcnow()
-                    },
-                    'XRP/USDC': {
-                        'price': usdc_ticker['last'],
-                        'bid': usdc_ticker['bid'],
-                        'ask': usdc_ticker['ask'],
-                        'volume': usdc_ticker['volume'],
-                        'timestamp': datetime.utcnow()
-                    }
-                }
-                self.last_update = datetime.utcnow()
+                self._publish_tick(usdt_ticker, usdc_ticker)
             except Exception as e:
                 self.logger.error(f"Error getting initial prices: {e}")
-                return {}
         
-        # Calculate spread
+        if not self.current_prices:
+            return {}
+        
         if 'XRP/USDT' in self.current_prices and 'XRP/USDC' in self.current_prices:
-            usdt_price = self.current_prices['XRP/USDT']['price']
-            usdc_price = self.current_prices['XRP/USDC']['price']
-            spread = abs(usdt_price - usdc_price)
-            spread_percentage = (spread / usdt_price) * 100
-            
             return {
                 'XRP/USDT': self.current_prices['XRP/USDT'],
                 'XRP/USDC': self.current_prices['XRP/USDC'],
-                'spread': spread,
-                'spread_percentage': spread_percentage,
+                'spread': self.current_spread,
+                'spread_percentage': self.current_spread_pct,
                 'last_update': self.last_update.isoformat() if self.last_update else None
             }
         
@@ -1,6 +1,7 @@
 import logging
 from datetime import datetime, timedelta
-from sqlalchemy import func
+import numpy as np
+from sqlalchemy import case, func
 from app import db
 from models import Trade
 
@@ -16,13 +17,19 @@ class ProfitAnalyzer:
             today = datetime.utcnow().date()
             today_start = datetime.combine(today, datetime.min.time())
             
-            # Get today's completed trades
-            today_trades = Trade.query.filter(
+            # Aggregate today's completed trades in the database
+            total_trades, total_profit_loss, total_volume, profitable_trades, losing_trades = db.session.query(
+                func.count(Trade.id),
+                func.sum(Trade.profit_loss),
+                func.sum(Trade.amount),
+                func.sum(case((Trade.profit_loss > 0, 1), else_=0)),
+                func.sum(case((Trade.profit_loss < 0, 1), else_=0))
+            ).filter(
                 Trade.created_at >= today_start,
                 Trade.status == 'completed'
-            ).all()
+            ).one()
             
-            if not today_trades:
+            if not total_trades:
                 return {
                     'total_trades': 0,
                     'total_profit_loss': 0.0,
@@ -33,15 +40,10 @@ class ProfitAnalyzer:
                     'losing_trades': 0
                 }
             
-            total_trades = len(today_trades)
-            total_profit_loss = sum(trade.profit_loss or 0 for trade in today_trades)
-            total_volume = sum(trade.amount for trade in today_trades)
-            avg_profit_per_trade = total_profit_loss / total_trades if total_trades > 0 else 0
-            
-            # Count profitable vs losing trades
-            profitable_trades = len([t for t in today_trades if (t.profit_loss or 0) > 0])
-            losing_trades = len([t for t in today_trades if (t.profit_loss or 0) < 0])
-            success_rate = (profitable_trades / total_trades * 100) if total_trades > 0 else 0
+            total_profit_loss = total_profit_loss or 0.0
+            total_volume = total_volume or 0.0
+            avg_profit_per_trade = total_profit_loss / total_trades
+            success_rate = profitable_trades / total_trades * 100
             
             return {
                 'total_trades': total_trades,
@@ -62,51 +64,56 @@ class ProfitAnalyzer:
         try:
             cutoff_date = datetime.utcnow() - timedelta(days=days)
             
-            # Get all completed trades in the period
-            trades = Trade.query.filter(
+            # Stream only the columns the statistics need, oldest first
+            rows = db.session.query(Trade.created_at, Trade.profit_loss, Trade.amount).filter(
                 Trade.created_at >= cutoff_date,
                 Trade.status == 'completed'
-            ).all()
+            ).order_by(Trade.created_at).all()
             
-            if not trades:
+            if not rows:
                 return self._empty_stats()
             
+            total_trades = len(rows)
+            hours = np.fromiter((row[0].hour for row in rows), dtype=np.int64, count=total_trades)
+            pnl = np.fromiter((row[1] or 0 for row in rows), dtype=np.float64, count=total_trades)
+            amounts = np.fromiter((row[2] or 0 for row in rows), dtype=np.float64, count=total_trades)
+            
             # Basic statistics
-            total_trades = len(trades)
-            total_profit_loss = sum(trade.profit_loss or 0 for trade in trades)
-            total_volume = sum(trade.amount for trade in trades)
+            total_profit_loss = float(pnl.sum())
+            total_volume = float(amounts.sum())
             
             # Profit/loss analysis
-            profitable_trades = [t for t in trades if (t.profit_loss or 0) > 0]
-            losing_trades = [t for t in trades if (t.profit_loss or 0) < 0]
+            profitable_trades = pnl[pnl > 0]
+            losing_trades = pnl[pnl < 0]
             
-            success_rate = (len(profitable_trades) / total_trades * 100) if total_trades > 0 else 0
-            avg_profit_per_trade = total_profit_loss / total_trades if total_trades > 0 else 0
+            success_rate = profitable_trades.size / total_trades * 100
+            avg_profit_per_trade = total_profit_loss / total_trades
             
             # Profit statistics
-            if profitable_trades:
-                avg_winning_trade = sum(t.profit_loss for t in profitable_trades) / len(profitable_trades)
-                max_winning_trade = max(t.profit_loss for t in profitable_trades)
+            if profitable_trades.size:
+                avg_winning_trade = float(profitable_trades.mean())
+                max_winning_trade = float(profitable_trades.max())
             else:
                 avg_winning_trade = 0
                 max_winning_trade = 0
             
             # Loss statistics
-            if losing_trades:
-                avg_losing_trade = sum(t.profit_loss for t in losing_trades) / len(losing_trades)
-                max_losing_trade = min(t.profit_loss for t in losing_trades)
+            if losing_trades.size:
+                avg_losing_trade = float(losing_trades.mean())
+                max_losing_trade = float(losing_trades.min())
             else:
                 avg_losing_trade = 0
                 max_losing_trade = 0
             
             # Drawdown analysis
-            drawdown_stats = self._calculate_drawdown(trades)
+            drawdown_stats = self._calculate_drawdown(pnl)
             
             # Time-based analysis
-            time_stats = self._analyze_time_performance(trades)
+            time_stats = self._analyze_time_performance(hours, pnl)
             
-            # Risk metrics
-            risk_metrics = self._calculate_risk_metrics(trades)
+            # Risk metrics, reusing the win/loss averages computed above
+            risk_metrics = self._calculate_risk_metrics(pnl, avg_profit_per_trade,
+                                                        avg_winning_trade, avg_losing_trade)
             
             return {
                 'period_days': days,
@@ -115,8 +122,8 @@ class ProfitAnalyzer:
                 'total_volume': total_volume,
                 'success_rate': success_rate,
                 'avg_profit_per_trade': avg_profit_per_trade,
-                'profitable_trades_count': len(profitable_trades),
-                'losing_trades_count': len(losing_trades),
+                'profitable_trades_count': int(profitable_trades.size),
+                'losing_trades_count': int(losing_trades.size),
                 'avg_winning_trade': avg_winning_trade,
                 'avg_losing_trade': avg_losing_trade,
                 'max_winning_trade': max_winning_trade,
@@ -150,39 +157,21 @@ class ProfitAnalyzer:
             'risk_metrics': {'sharpe_ratio': 0, 'win_loss_ratio': 0}
         }
     
-    def _calculate_drawdown(self, trades):
-        """Calculate maximum and current drawdown"""
+    def _calculate_drawdown(self, pnl):
+        """Calculate maximum and current drawdown from time-ordered trade P&L"""
         try:
-            if not trades:
+            if not pnl.size:
                 return {'max_drawdown': 0, 'current_drawdown': 0}
             
-            # Sort trades by time
-            sorted_trades = sorted(trades, key=lambda x: x.created_at)
-            
             # Calculate cumulative P&L
-            cumulative_pnl = []
-            running_total = 0
-            
-            for trade in sorted_trades:
-                running_total += trade.profit_loss or 0
-                cumulative_pnl.append(running_total)
-            
-            # Calculate drawdown
-            peak = cumulative_pnl[0]
-            max_drawdown = 0
-            current_drawdown = 0
-            
-            for pnl in cumulative_pnl:
-                if pnl > peak:
-                    peak = pnl
-                
-                drawdown = peak - pnl
-                if drawdown > max_drawdown:
-                    max_drawdown = drawdown
+            cumulative_pnl = np.cumsum(pnl)
+            
+            # Calculate drawdown against the running peak
+            running_peak = np.maximum.accumulate(cumulative_pnl)
+            max_drawdown = float((running_peak - cumulative_pnl).max())
             
             # Current drawdown is from the last peak
-            current_peak = max(cumulative_pnl)
-            current_drawdown = current_peak - cumulative_pnl[-1]
+            current_drawdown = float(running_peak[-1] - cumulative_pnl[-1])
             
             return {
                 'max_drawdown': max_drawdown,
@@ -193,33 +182,22 @@ class ProfitAnalyzer:
             self.logger.error(f"Error calculating drawdown: {e}")
             return {'max_drawdown': 0, 'current_drawdown': 0}
     
-    def _analyze_time_performance(self, trades):
+    def _analyze_time_performance(self, hours, pnl):
         """Analyze performance by time of day"""
         try:
-            if not trades:
+            if not pnl.size:
                 return {'best_hour': 0, 'worst_hour': 0}
             
-            # Group trades by hour
-            hourly_performance = {}
-            
-            for trade in trades:
-                hour = trade.created_at.hour
-                if hour not in hourly_performance:
-                    hourly_performance[hour] = []
-                hourly_performance[hour].append(trade.profit_loss or 0)
-            
-            # Calculate average performance per hour
-            hourly_avg = {}
-            for hour, profits in hourly_performance.items():
-                hourly_avg[hour] = sum(profits) / len(profits)
+            # Average P&L per hour of day, for hours that saw trades
+            counts = np.bincount(hours, minlength=24)
+            totals = np.bincount(hours, weights=pnl, minlength=24)
+            traded_hours = np.nonzero(counts)[0]
+            hourly_avg = totals[traded_hours] / counts[traded_hours]
             
             # Find best and worst hours
-            if hourly_avg:
-                best_hour = max(hourly_avg.keys(), key=lambda k: hourly_avg[k])
-                worst_hour = min(hourly_avg.keys(), key=lambda k: hourly_avg[k])
-            else:
-                best_hour = 0
-                worst_hour = 0
+            best_hour = int(traded_hours[hourly_avg.argmax()])
+            worst_hour = int(traded_hours[hourly_avg.argmin()])
+            hourly_avg = dict(zip(traded_hours.tolist(), hourly_avg.tolist()))
             
             return {
                 'best_hour': best_hour,
@@ -231,31 +209,27 @@ class ProfitAnalyzer:
             self.logger.error(f"Error analyzing time performance: {e}")
             return {'best_hour': 0, 'worst_hour': 0}
     
-    def _calculate_risk_metrics(self, trades):
-        """Calculate risk-adjusted performance metrics"""
+    def _calculate_risk_metrics(self, pnl, avg_return, avg_win, avg_loss):
+        """
+        Calculate risk-adjusted performance metrics
+        
+        Args:
+            pnl: Per-trade profit/loss array
+            avg_return: Mean of pnl
+            avg_win, avg_loss: Mean winning and losing trade, 0 when there are none
+        """
         try:
-            if not trades or len(trades) < 2:
+            if pnl.size < 2:
                 return {'sharpe_ratio': 0, 'win_loss_ratio': 0}
             
-            # Calculate returns
-            returns = [trade.profit_loss or 0 for trade in trades]
-            avg_return = sum(returns) / len(returns)
-            
-            # Calculate standard deviation
-            variance = sum((r - avg_return) ** 2 for r in returns) / (len(returns) - 1)
-            std_dev = variance ** 0.5
+            std_dev = float(pnl.std(ddof=1))
             
             # Sharpe ratio (assuming risk-free rate of 0)
             sharpe_ratio = avg_return / std_dev if std_dev > 0 else 0
             
             # Win/Loss ratio
-            profitable_trades = [r for r in returns if r > 0]
-            losing_trades = [r for r in returns if r < 0]
-            
-            if profitable_trades and losing_trades:
-                avg_win = sum(profitable_trades) / len(profitable_trades)
-                avg_loss = abs(sum(losing_trades) / len(losing_trades))
-                win_loss_ratio = avg_win / avg_loss
+            if avg_win and avg_loss:
+                win_loss_ratio = avg_win / abs(avg_loss)
             else:
                 win_loss_ratio = 0
             
@@ -275,27 +249,27 @@ class ProfitAnalyzer:
         try:
             cutoff_date = datetime.utcnow() - timedelta(days=days)
             
-            # Get trades grouped by date
-            trades = Trade.query.filter(
+            # Group by date in the database
+            trade_date = func.date(Trade.created_at)
+            rows = db.session.query(
+                trade_date,
+                func.count(Trade.id),
+                func.sum(Trade.profit_loss),
+                func.sum(Trade.amount)
+            ).filter(
                 Trade.created_at >= cutoff_date,
                 Trade.status == 'completed'
-            ).all()
+            ).group_by(trade_date).order_by(trade_date).all()
             
-            # Group by date
             daily_performance = {}
-            
-            for trade in trades:
-                date_key = trade.created_at.date().isoformat()
-                if date_key not in daily_performance:
-                    daily_performance[date_key] = {
-                        'trades': 0,
-                        'profit_loss': 0.0,
-                        'volume': 0.0
-                    }
-                
-                daily_performance[date_key]['trades'] += 1
-                daily_performance[date_key]['profit_loss'] += trade.profit_loss or 0
-                daily_performance[date_key]['volume'] += trade.amount
+            for day, trades, profit_loss, volume in rows:
+                # SQLite returns DATE() as a string, other backends as a date
+                date_key = day if isinstance(day, str) else day.isoformat()
+                daily_performance[date_key] = {
+                    'trades': trades,
+                    'profit_loss': profit_loss or 0.0,
+                    'volume': volume or 0.0
+                }
             
             return daily_performance
             
@@ -308,30 +282,26 @@ class ProfitAnalyzer:
         try:
             cutoff_date = datetime.utcnow() - timedelta(days=days)
             
-            trades = Trade.query.filter(
+            # Group by pair in the database; avg_price is the plain mean of trade prices
+            rows = db.session.query(
+                Trade.pair,
+                func.count(Trade.id),
+                func.sum(Trade.profit_loss),
+                func.sum(Trade.amount),
+                func.avg(Trade.price)
+            ).filter(
                 Trade.created_at >= cutoff_date,
                 Trade.status == 'completed'
-            ).all()
+            ).group_by(Trade.pair).all()
             
-            # Group by pair
             pair_performance = {}
-            
-            for trade in trades:
-                pair = trade.pair
-                if pair not in pair_performance:
-                    pair_performance[pair] = {
-                        'trades': 0,
-                        'profit_loss': 0.0,
-                        'volume': 0.0,
-                        'avg_price': 0.0
-                    }
-                
-                pair_performance[pair]['trades'] += 1
-                pair_performance[pair]['profit_loss'] += trade.profit_loss or 0
-                pair_performance[pair]['volume'] += trade.amount
-                pair_performance[pair]['avg_price'] = (
-                    pair_performance[pair]['avg_price'] * (pair_performance[pair]['trades'] - 1) + trade.price
-                ) / pair_performance[pair]['trades']
+            for pair, trades, profit_loss, volume, avg_price in rows:
+                pair_performance[pair] = {
+                    'trades': trades,
+                    'profit_loss': profit_loss or 0.0,
+                    'volume': volume or 0.0,
+                    'avg_price': avg_price or 0.0
+                }
             
             return pair_performance
             
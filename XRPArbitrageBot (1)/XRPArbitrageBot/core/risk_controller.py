@@ -1,17 +1,92 @@
 import logging
+import time
 from datetime import datetime, timedelta
+import numpy as np
+from sqlalchemy import bindparam, func, select
 from app import db
-from models import Trade, TradingConfig, Balance, CircuitBreaker
+from models import Trade, TradingConfig, Balance, CircuitBreaker, PriceHistory, SystemLog
 from core.balance_manager import BalanceManager
+from core.price_monitor import PriceMonitor
 from core.volume_tracker import VolumeTracker
 
+# Statements used on every risk check are built once; per-call values bind as :since
+_PENDING_COUNT_STMT = select(func.count(Trade.id)).where(Trade.status == 'pending')
+
+_TODAY_VOLUME_STMT = select(func.coalesce(func.sum(Trade.amount), 0.0)).where(
+    Trade.created_at >= bindparam('since'),
+    Trade.status.in_(('completed', 'pending'))
+)
+
+_RECENT_TRADE_STMT = select(
+    select(Trade.id).where(Trade.created_at >= bindparam('since')).exists()
+)
+
+_PRICE_RANGE_STMT = select(
+    func.min(PriceHistory.price),
+    func.max(PriceHistory.price),
+    func.count(PriceHistory.id)
+).where(PriceHistory.timestamp >= bindparam('since'))
+
+_PAIR_RANGE_STMT = select(
+    func.min(PriceHistory.price),
+    func.max(PriceHistory.price),
+    func.avg(PriceHistory.price),
+    func.count(PriceHistory.id)
+).where(
+    PriceHistory.timestamp >= bindparam('since'),
+    PriceHistory.pair.in_(('XRP/USDT', 'XRP/USDC'))
+).group_by(PriceHistory.pair)
+
+_STABILITY_STMT = select(
+    select(func.count(SystemLog.id)).where(
+        SystemLog.timestamp >= bindparam('since'),
+        SystemLog.level == 'ERROR'
+    ).scalar_subquery(),
+    select(func.count(Trade.id)).where(
+        Trade.created_at >= bindparam('since')
+    ).scalar_subquery(),
+    select(func.count(Trade.id)).where(
+        Trade.created_at >= bindparam('since'),
+        Trade.status.in_(('failed', 'timeout'))
+    ).scalar_subquery()
+)
+
 class RiskController:
     """Enhanced risk management with circuit breakers and volatility-based sizing"""
     
+    HEALTH_CACHE_TTL = 3  # seconds
+    TRADE_STATE_TTL = 1  # seconds balances and the pending count are reused between trades
+    VOLATILITY_CACHE_TTL = 5  # seconds
+    
     def __init__(self):
         self.balance_manager = BalanceManager()
         self.volume_tracker = VolumeTracker()
         self.logger = logging.getLogger(__name__)
+        self._health_cache = (None, 0.0)  # (status, expires_at)
+        self._balances_cache = (None, 0.0)  # (balances, expires_at)
+        self._pending_cache = (None, 0.0)  # (pending trade count, expires_at)
+        self._volatility_cache = (None, 0.0)  # (volatility factor, expires_at)
+    
+    def _get_balances(self):
+        """Get balances, reused for TRADE_STATE_TTL seconds"""
+        balances, expires_at = self._balances_cache
+        if balances is None or time.monotonic() >= expires_at:
+            balances = self.balance_manager.get_balances()
+            self._balances_cache = (balances, time.monotonic() + self.TRADE_STATE_TTL)
+        return balances
+    
+    def _get_pending_count(self):
+        """Count pending trades, reused for TRADE_STATE_TTL seconds"""
+        pending_count, expires_at = self._pending_cache
+        if pending_count is None or time.monotonic() >= expires_at:
+            pending_count = db.session.scalar(_PENDING_COUNT_STMT)
+            self._pending_cache = (pending_count, time.monotonic() + self.TRADE_STATE_TTL)
+        return pending_count
+    
+    def invalidate_trade_state(self):
+        """Drop cached balances and pending count after a trade is placed or settled"""
+        self._balances_cache = (None, 0.0)
+        self._pending_cache = (None, 0.0)
     
     def check_trade_risk(self, opportunity, config):
         """
@@ -37,10 +112,10 @@ class RiskController:
             
             # 1. Calculate volatility-adjusted trade amount
             adjusted_amount = self._calculate_volatility_adjusted_amount(opportunity, config)
-            opportunity['amount'] = adjusted_amount  # Update opportunity with adjusted amount
+            opportunity.amount = adjusted_amount  # Update opportunity with adjusted amount
             
             # 2. Check daily volume limits with adjusted amount
-            trade_value_usd = adjusted_amount * opportunity['sell_price']
+            trade_value_usd = adjusted_amount * opportunity.sell_price
             volume_check = self.volume_tracker.check_daily_volume_limit(trade_value_usd, config)
             if not volume_check['allowed']:
                 return {
@@ -115,12 +190,7 @@ class RiskController:
             today_start = datetime.combine(today, datetime.min.time())
             
             # Calculate today's total volume
-            today_trades = Trade.query.filter(
-                Trade.created_at >= today_start,
-                Trade.status.in_(['completed', 'pending'])
-            ).all()
-            
-            today_volume = sum(trade.amount for trade in today_trades)
+            today_volume = db.session.scalar(_TODAY_VOLUME_STMT, {'since': today_start})
             
             if today_volume + trade_amount > daily_limit:
                 return {
@@ -137,7 +207,7 @@ class RiskController:
     def _check_balance_safety(self, trade_amount, risk_buffer):
         """Check if balances have sufficient safety margins"""
         try:
-            balances = self.balance_manager.get_balances()
+            balances = self._get_balances()
             
             # Check XRP balance (for sell order)
             xrp_balance = balances.get('XRP', {}).get('free', 0)
@@ -172,7 +242,7 @@ class RiskController:
     def _check_pending_orders_limit(self, max_pending):
         """Check if pending orders limit would be exceeded"""
         try:
-            pending_count = Trade.query.filter_by(status='pending').count()
+            pending_count = self._get_pending_count()
             
             if pending_count >= max_pending:
                 return {
@@ -189,21 +259,27 @@ class RiskController:
     def _check_price_volatility(self, opportunity):
         """Check if price volatility is within acceptable limits"""
         try:
-            # Get recent price movements
-            recent_cutoff = datetime.utcnow() - timedelta(minutes=5)
-            
-            from models import PriceHistory
-            recent_prices = PriceHistory.query.filter(
-                PriceHistory.timestamp >= recent_cutoff
-            ).order_by(PriceHistory.timestamp.desc()).limit(20).all()
+            # Get recent price movements, from the monitor's in-memory window while it runs
+            monitor = PriceMonitor.get_monitor()
+            if monitor.running:
+                recent_cutoff = time.monotonic() - 300
+                prices = np.fromiter((price for window in monitor.recent_prices.values()
+                                      for ts, price in list(window) if ts >= recent_cutoff), dtype=np.float64)
+                sample_count = prices.size
+                if sample_count:
+                    min_price, max_price = float(prices.min()), float(prices.max())
+            else:
+                recent_cutoff = datetime.utcnow() - timedelta(minutes=5)
+                
+                # Let the database reduce the window to its range
+                min_price, max_price, sample_count = db.session.execute(
+                    _PRICE_RANGE_STMT, {'since': recent_cutoff}
+                ).one()
             
-            if len(recent_prices) < 5:
+            if sample_count < 5:
                 return {'safe': True, 'reason': 'Insufficient price history for volatility check'}
             
             # Calculate price volatility
-            prices = [p.price for p in recent_prices]
-            max_price = max(prices)
-            min_price = min(prices)
             volatility = (max_price - min_price) / min_price
             
             # If volatility > 2%, it's too risky
@@ -222,7 +298,7 @@ class RiskController:
     def _check_spread_validity(self, opportunity, min_spread):
         """Check if spread is still valid and above threshold"""
         try:
-            current_spread = opportunity.get('spread_percentage', 0)
+            current_spread = opportunity.spread_percentage
             
             if current_spread < min_spread:
                 return {
@@ -248,15 +324,14 @@ class RiskController:
         try:
             recent_cutoff = datetime.utcnow() - timedelta(seconds=min_interval_seconds)
             
-            recent_trades = Trade.query.filter(
-                Trade.created_at >= recent_cutoff
-            ).count()
+            # Only whether a trade exists matters, so stop at the first match
+            traded_recently = db.session.scalar(_RECENT_TRADE_STMT, {'since': recent_cutoff})
             
             # Allow max 1 trade per 30 seconds
-            if recent_trades > 0:
+            if traded_recently:
                 return {
                     'safe': False,
-                    'reason': f'Trading too frequently: {recent_trades} trades in last {min_interval_seconds}s'
+                    'reason': f'Trading too frequently: already traded in last {min_interval_seconds}s'
                 }
             
             return {'safe': True, 'reason': 'Trading frequency OK'}
@@ -266,7 +341,17 @@ class RiskController:
             return {'safe': True, 'reason': 'Frequency check skipped due to error'}
     
     def check_system_health(self):
-        """Check overall system health"""
+        """Check overall system health (cached for HEALTH_CACHE_TTL seconds)"""
+        status, expires_at = self._health_cache
+        if status is not None and time.monotonic() < expires_at:
+            return status
+        
+        status = self._compute_system_health()
+        self._health_cache = (status, time.monotonic() + self.HEALTH_CACHE_TTL)
+        return status
+    
+    def _compute_system_health(self):
+        """Run the database, balance and pending-order health checks"""
         try:
             health_status = {
                 'healthy': True,
@@ -324,12 +409,7 @@ class RiskController:
             today = datetime.utcnow().date()
             today_start = datetime.combine(today, datetime.min.time())
             
-            today_trades = Trade.query.filter(
-                Trade.created_at >= today_start,
-                Trade.status.in_(['completed', 'pending'])
-            ).all()
-            
-            today_volume = sum(trade.amount for trade in today_trades)
+            today_volume = db.session.scalar(_TODAY_VOLUME_STMT, {'since': today_start})
             remaining_daily_volume = config.daily_max_volume - today_volume
             
             # Return the minimum of the constraints
@@ -363,7 +443,7 @@ class RiskController:
                 adjusted_amount = base_amount
             
             # Apply spread-based adjustment (larger spreads allow larger positions)
-            spread_percentage = opportunity.get('spread_percentage', 0)
+            spread_percentage = opportunity.spread_percentage
             if spread_percentage > 0.5:  # Large spread > 0.5%
                 spread_multiplier = min(1.5, 1 + (spread_percentage / 100))
                 adjusted_amount *= spread_multiplier
@@ -381,31 +461,37 @@ class RiskController:
             return config.trade_amount
     
     def _calculate_price_volatility_factor(self):
+        """Get the price volatility factor (cached for VOLATILITY_CACHE_TTL seconds)"""
+        factor, expires_at = self._volatility_cache
+        if factor is not None and time.monotonic() < expires_at:
+            return factor
+        
+        factor = self._compute_price_volatility_factor()
+        self._volatility_cache = (factor, time.monotonic() + self.VOLATILITY_CACHE_TTL)
+        return factor
+    
+    def _compute_price_volatility_factor(self):
         """Calculate price volatility factor over recent periods"""
         try:
-            # Get price data from the last 30 minutes
-            recent_cutoff = datetime.utcnow() - timedelta(minutes=30)
-            
-            from models import PriceHistory
-            recent_prices = PriceHistory.query.filter(
-                PriceHistory.timestamp >= recent_cutoff
-            ).order_by(PriceHistory.timestamp.desc()).limit(60).all()
-            
-            if len(recent_prices) < 10:
+            # Per-pair price range over the last 30 minutes, kept incrementally by the running monitor
+            pair_stats = []
+            monitor = PriceMonitor.get_monitor()
+            if monitor.running:
+                pair_stats = [stats for stats in (window.stats() for window in monitor.price_ranges.values())
+                              if stats is not None]
+            
+            # Fall back to the database until the monitor has enough samples of its own
+            if sum(stats[3] for stats in pair_stats) < 10:
+                recent_cutoff = datetime.utcnow() - timedelta(minutes=30)
+                pair_stats = db.session.execute(_PAIR_RANGE_STMT, {'since': recent_cutoff}).all()
+            
+            if sum(stats[3] for stats in pair_stats) < 10:
                 return 1.0  # Normal volatility if insufficient data
             
-            # Separate by pair and calculate volatility
-            usdt_prices = [p.price for p in recent_prices if p.pair == 'XRP/USDT']
-            usdc_prices = [p.price for p in recent_prices if p.pair == 'XRP/USDC']
-            
             volatility_factors = []
             
-            for prices in [usdt_prices, usdc_prices]:
-                if len(prices) >= 5:
-                    max_price = max(prices)
-                    min_price = min(prices)
-                    avg_price = sum(prices) / len(prices)
-                    
+            for min_price, max_price, avg_price, sample_count in pair_stats:
+                if sample_count >= 5:
                     # Calculate coefficient of variation (volatility relative to mean)
                     volatility = (max_price - min_price) / avg_price
                     volatility_factors.append(volatility)
@@ -452,14 +538,13 @@ class RiskController:
             stability_score = 100  # Start with perfect score
             warnings = []
             
-            # Check recent error rate
+            # Error and trade counts for the window in one round trip, as scalar subqueries
             recent_cutoff = datetime.utcnow() - timedelta(minutes=15)
-            from models import SystemLog
-            recent_errors = SystemLog.query.filter(
-                SystemLog.timestamp >= recent_cutoff,
-                SystemLog.level == 'ERROR'
-            ).count()
+            recent_errors, recent_trades, failed_trades = db.session.execute(
+                _STABILITY_STMT, {'since': recent_cutoff}
+            ).one()
             
+            # Check recent error rate
             if recent_errors > 5:
                 stability_score -= 30
                 warnings.append(f'High error rate: {recent_errors} errors in 15 minutes')
@@ -468,20 +553,15 @@ class RiskController:
                 warnings.append(f'Elevated error rate: {recent_errors} errors in 15 minutes')
             
             # Check balance consistency
-            balances = self.balance_manager.get_balances()
+            balances = self._get_balances()
             for currency, balance in balances.items():
                 if balance['locked'] > balance['total']:
                     stability_score -= 50
                     warnings.append(f'Balance inconsistency in {currency}')
             
             # Check trade success rate
-            recent_trades = Trade.query.filter(
-                Trade.created_at >= recent_cutoff
-            ).all()
-            
             if recent_trades:
-                failed_trades = len([t for t in recent_trades if t.status in ['failed', 'timeout']])
-                failure_rate = failed_trades / len(recent_trades)
+                failure_rate = failed_trades / recent_trades
                 
                 if failure_rate > 0.3:  # More than 30% failure rate
                     stability_score -= 40
@@ -128,7 +128,7 @@ class SecurityManager:
                 ]
                 
                 if recent_calls:
-                    error_rate = len([c for c in recent_calls if c['response_code'] >= 400]) / len(recent_calls)
+                    error_rate = sum(1 for c in recent_calls if c['response_code'] >= 400) / len(recent_calls)
                     
                     if error_rate > 0.5:  # More than 50% errors
                         self.logger.critical(f"High API error rate for {api_endpoint}: {error_rate:.1%}")
@@ -216,10 +216,10 @@ class SecurityManager:
             recent_alerts = self.check_suspicious_activity()
             
             # Rate limiting status
-            active_rate_limits = len([
-                identifier for identifier, times in self.rate_limits.items()
+            active_rate_limits = sum(
+                1 for times in self.rate_limits.values()
                 if any(t > current_time - 60 for t in times)
-            ])
+            )
             
             return {
                 'encryption_enabled': True,
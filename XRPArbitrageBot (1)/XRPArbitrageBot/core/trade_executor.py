@@ -6,13 +6,13 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 from app import db
 from models import Trade
 from core.api_connector import APIConnector
-from core.balance_manager import BalanceManager
+from core.balance_manager import BalanceManager, BalanceUpdateError
 
 class TradeExecutor:
     """Advanced trade execution with ATOMIC EXECUTION for arbitrage"""
     
     def __init__(self):
-        self.api = APIConnector()
+        self.api = APIConnector.get_connector()
         self.balance_manager = BalanceManager()
         self.logger = logging.getLogger(__name__)
         self.pending_orders = {}
@@ -22,16 +22,13 @@ class TradeExecutor:
             'maker_fee': 0.0002,  # 0.02%
             'taker_fee': 0.0006   # 0.06%
         }
-        
-        # Connect to API
-        self.api.connect()
     
     def execute_arbitrage_trade(self, opportunity):
         """
         Execute ATOMIC ARBITRAGE TRADE: Both orders placed simultaneously
         
         Args:
-            opportunity: Dict with trade details
+            opportunity: Opportunity with trade details
                 - sell_pair: pair to sell (e.g., 'XRP/USDT')
                 - buy_pair: pair to buy (e.g., 'XRP/USDC')
                 - amount: XRP amount to trade
@@ -46,9 +43,9 @@ class TradeExecutor:
                 self.logger.warning(f"Maximum pending orders limit reached: {current_pending}/{self.max_pending_orders}")
                 return None
             
-            amount = opportunity['amount']
-            sell_pair = opportunity['sell_pair']
-            buy_pair = opportunity['buy_pair']
+            amount = opportunity.amount
+            sell_pair = opportunity.sell_pair
+            buy_pair = opportunity.buy_pair
             
             self.logger.info(f"Starting ATOMIC arbitrage trade: {amount} XRP ({sell_pair} -> {buy_pair})")
             
@@ -142,15 +139,13 @@ class TradeExecutor:
                 trade.status = 'completed'
                 trade.completed_at = datetime.utcnow()
                 
-                # Update balances
-                self.balance_manager.unlock_balance('XRP', amount)
-                self.balance_manager.update_balance('XRP', -amount)
-                
-                # Determine which stablecoin we received
-                if 'USDT' in pair:
-                    self.balance_manager.update_balance('USDT', trade.total_value)
-                else:
-                    self.balance_manager.update_balance('USDC', trade.total_value)
+                # Update balances and the trade record in one commit
+                with self.balance_manager.transaction():
+                    self.balance_manager.unlock_balance('XRP', amount)
+                    
+                    # Determine which stablecoin we received
+                    stablecoin = 'USDT' if 'USDT' in pair else 'USDC'
+                    self.balance_manager.update_balances({'XRP': -amount, stablecoin: trade.total_value})
                 
                 self.logger.info(f"Sell order completed: {amount} XRP at {order['price']:.4f}")
             
@@ -215,10 +210,10 @@ class TradeExecutor:
                 trade.status = 'completed'
                 trade.completed_at = datetime.utcnow()
                 
-                # Update balances
-                self.balance_manager.unlock_balance(currency, required_value)
-                self.balance_manager.update_balance(currency, -trade.total_value)
-                self.balance_manager.update_balance('XRP', amount)
+                # Update balances and the trade record in one commit
+                with self.balance_manager.transaction():
+                    self.balance_manager.unlock_balance(currency, required_value)
+                    self.balance_manager.update_balances({currency: -trade.total_value, 'XRP': amount})
                 
                 self.logger.info(f"Buy order completed: {amount} XRP at {order['price']:.4f}")
             
@@ -257,23 +252,30 @@ class TradeExecutor:
         try:
             pending_trades = Trade.query.filter_by(status='pending').all()
             
+            # Cancel on the exchange first so no write transaction is held across API calls
             for trade in pending_trades:
                 if trade.order_id:
                     try:
                         self.api.cancel_order(trade.order_id, trade.pair)
                     except:
                         pass  # Order might already be completed
-                
-                trade.status = 'cancelled'
-                
-                # Unlock balances
-                if trade.trade_type == 'sell':
-                    self.balance_manager.unlock_balance('XRP', trade.amount)
-                else:
-                    currency = 'USDT' if 'USDT' in trade.pair else 'USDC'
-                    self.balance_manager.unlock_balance(currency, trade.total_value)
             
-            db.session.commit()
+            # Release each trade in its own commit so one failed unlock doesn't undo the rest
+            for trade in pending_trades:
+                order_id = trade.order_id
+                try:
+                    with self.balance_manager.transaction():
+                        trade.status = 'cancelled'
+                        
+                        # Unlock balances
+                        if trade.trade_type == 'sell':
+                            self.balance_manager.unlock_balance('XRP', trade.amount)
+                        else:
+                            currency = 'USDT' if 'USDT' in trade.pair else 'USDC'
+                            self.balance_manager.unlock_balance(currency, trade.total_value)
+                except BalanceUpdateError as e:
+                    self.logger.error(f"Could not release cancelled order {order_id}: {e}")
+            
             self.logger.info(f"Cancelled {len(pending_trades)} pending orders")
             
         except Exception as e:
@@ -283,9 +285,9 @@ class TradeExecutor:
     def _calculate_net_profit_with_fees(self, opportunity):
         """Calculate net profit after exchange fees"""
         try:
-            amount = opportunity['amount']
-            sell_price = opportunity['sell_price']
-            buy_price = opportunity['buy_price']
+            amount = opportunity.amount
+            sell_price = opportunity.sell_price
+            buy_price = opportunity.buy_price
             
             # Calculate gross values
             sell_gross = amount * sell_price
@@ -311,9 +313,9 @@ class TradeExecutor:
     def _validate_atomic_trade_balances(self, opportunity):
         """Validate that we have sufficient balances for atomic trade"""
         try:
-            amount = opportunity['amount']
-            buy_pair = opportunity['buy_pair']
-            buy_price = opportunity['buy_price']
+            amount = opportunity.amount
+            buy_pair = opportunity.buy_pair
+            buy_price = opportunity.buy_price
             
             # Check XRP balance for sell side
             if not self.balance_manager.check_sufficient_balance('XRP', amount):
@@ -341,16 +343,16 @@ class TradeExecutor:
             
             # Prepare order parameters
             sell_params = {
-                'pair': opportunity['sell_pair'],
-                'amount': opportunity['amount'],
-                'expected_price': opportunity['sell_price'],
+                'pair': opportunity.sell_pair,
+                'amount': opportunity.amount,
+                'expected_price': opportunity.sell_price,
                 'trade_type': 'sell'
             }
             
             buy_params = {
-                'pair': opportunity['buy_pair'],
-                'amount': opportunity['amount'],
-                'expected_price': opportunity['buy_price'],
+                'pair': opportunity.buy_pair,
+                'amount': opportunity.amount,
+                'expected_price': opportunity.buy_price,
                 'trade_type': 'buy'
             }
             
@@ -451,17 +453,16 @@ class TradeExecutor:
                 trade.status = 'completed'
                 trade.completed_at = datetime.utcnow()
                 
-                # Update balances
-                self.balance_manager.unlock_balance(currency, lock_amount)
-                
-                if trade_type == 'sell':
-                    self.balance_manager.update_balance('XRP', -amount)
-                    stablecoin = 'USDT' if 'USDT' in pair else 'USDC'
-                    self.balance_manager.update_balance(stablecoin, trade.total_value)
-                else:
-                    currency = 'USDT' if 'USDT' in pair else 'USDC'
-                    self.balance_manager.update_balance(currency, -trade.total_value)
-                    self.balance_manager.update_balance('XRP', amount)
+                # Update balances and the trade record in one commit
+                with self.balance_manager.transaction():
+                    self.balance_manager.unlock_balance(currency, lock_amount)
+                    
+                    if trade_type == 'sell':
+                        stablecoin = 'USDT' if 'USDT' in pair else 'USDC'
+                        self.balance_manager.update_balances({'XRP': -amount, stablecoin: trade.total_value})
+                    else:
+                        currency = 'USDT' if 'USDT' in pair else 'USDC'
+                        self.balance_manager.update_balances({currency: -trade.total_value, 'XRP': amount})
                 
                 self.logger.info(f"{trade_type.title()} order completed: {amount} XRP at {order['price']:.4f}")
             else:
@@ -522,8 +523,8 @@ class TradeExecutor:
     def _calculate_slippage(self, opportunity, sell_trade, buy_trade):
         """Calculate slippage compared to expected prices"""
         try:
-            expected_sell_price = opportunity['sell_price']
-            expected_buy_price = opportunity['buy_price']
+            expected_sell_price = opportunity.sell_price
+            expected_buy_price = opportunity.buy_price
             
             actual_sell_price = sell_trade.price if sell_trade else expected_sell_price
             actual_buy_price = buy_trade.price if buy_trade else expected_buy_price
@@ -551,28 +552,41 @@ class TradeExecutor:
                 Trade.created_at < cutoff_time
             ).all()
             
+            # Try to get final statuses before any write transaction is opened
+            final_statuses = {}
             for trade in timed_out_trades:
                 self.logger.warning(f"Order timeout detected: {trade.order_id}")
                 
-                # Try to get final status
                 if trade.order_id:
                     try:
-                        status = self.api.get_order_status(trade.order_id, trade.pair)
-                        if status['status'] == 'closed':
+                        final_statuses[trade.id] = self.api.get_order_status(trade.order_id, trade.pair)['status']
+                    except:
+                        final_statuses[trade.id] = None
+            
+            # Resolve each order in its own commit so one failed unlock doesn't undo the rest
+            for trade in timed_out_trades:
+                if trade.id not in final_statuses:
+                    continue
+                
+                order_id = trade.order_id
+                try:
+                    with self.balance_manager.transaction():
+                        status = final_statuses[trade.id]
+                        if status == 'closed':
                             trade.status = 'completed'
                             trade.completed_at = datetime.utcnow()
                         else:
                             trade.status = 'timeout'
-                            # Unlock balances
-                            if trade.trade_type == 'sell':
-                                self.balance_manager.unlock_balance('XRP', trade.amount)
-                            else:
-                                currency = 'USDT' if 'USDT' in trade.pair else 'USDC'
-                                self.balance_manager.unlock_balance(currency, trade.total_value)
-                    except:
-                        trade.status = 'timeout'
+                            if status is not None:
+                                # Unlock balances
+                                if trade.trade_type == 'sell':
+                                    self.balance_manager.unlock_balance('XRP', trade.amount)
+                                else:
+                                    currency = 'USDT' if 'USDT' in trade.pair else 'USDC'
+                                    self.balance_manager.unlock_balance(currency, trade.total_value)
+                except BalanceUpdateError as e:
+                    self.logger.error(f"Could not resolve timed-out order {order_id}: {e}")
             
-            db.session.commit()
             
         except Exception as e:
             self.logger.error(f"Error checking order timeouts: {e}")
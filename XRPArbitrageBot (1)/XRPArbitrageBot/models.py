@@ -50,6 +50,12 @@ class Trade(db.Model):
     order_id = db.Column(db.String(100))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     completed_at = db.Column(db.DateTime)
+    
+    # Time-window aggregates grouped by status/pair, and pending-order counts/scans
+    __table_args__ = (
+        db.Index('ix_trade_created_status_pair', 'created_at', 'status', 'pair'),
+        db.Index('ix_trade_status_created', 'status', 'created_at'),
+    )
 
 class Balance(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -64,6 +70,12 @@ class PriceHistory(db.Model):
     price = db.Column(db.Float, nullable=False)
     volume = db.Column(db.Float)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Per-pair and all-pair time-window scans
+    __table_args__ = (
+        db.Index('ix_price_history_pair_timestamp', 'pair', 'timestamp'),
+        db.Index('ix_price_history_timestamp', 'timestamp'),
+    )
 
 class ArbitrageOpportunity(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -83,6 +95,12 @@ class SystemLog(db.Model):
     error_details = db.Column(db.Text)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # Recent-log listings (optionally by level) and age-based cleanup
+    __table_args__ = (
+        db.Index('ix_system_log_level_timestamp', 'level', 'timestamp'),
+        db.Index('ix_system_log_timestamp', 'timestamp'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
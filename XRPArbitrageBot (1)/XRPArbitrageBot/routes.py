@@ -28,7 +28,7 @@ def get_core_modules():
         from core.config_manager import ConfigManager
         from business.arbitrage_engine import ArbitrageEngine
         
-        price_monitor = PriceMonitor()
+        price_monitor = PriceMonitor.get_monitor()
         balance_manager = BalanceManager()
         trade_executor = TradeExecutor()
         profit_analyzer = ProfitAnalyzer()
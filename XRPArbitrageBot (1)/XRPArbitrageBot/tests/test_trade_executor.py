@@ -0,0 +1,40 @@
+import pytest
+from app import app, db
+from models import Balance, Trade
+from core.trade_executor import TradeExecutor
+
+@pytest.fixture
+def executor():
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([
+            Balance(currency='XRP', amount=100.0, locked=0.0),
+            Balance(currency='USDT', amount=1000.0, locked=0.0)
+        ])
+        db.session.commit()
+        
+        yield TradeExecutor()
+        
+        db.session.remove()
+        db.drop_all()
+
+def test_sell_order_fails_when_balance_update_fails(executor, monkeypatch):
+    """A filled order whose balance settlement fails must not be reported or stored"""
+    monkeypatch.setattr(executor.api, 'create_order', lambda **kwargs: {'id': 'order-1', 'price': 0.5})
+    monkeypatch.setattr(executor.api, 'get_order_status', lambda order_id, symbol: {'status': 'closed'})
+    
+    # update_balances is the only step of a sell that touches the USDT row
+    get_row = executor.balance_manager._get_row
+    
+    def failing_get_row(currency):
+        if currency == 'USDT':
+            raise RuntimeError("USDT balance unavailable")
+        return get_row(currency)
+    
+    monkeypatch.setattr(executor.balance_manager, '_get_row', failing_get_row)
+    
+    assert executor._execute_sell_order('XRP/USDT', 10.0, 0.5) is None
+    assert Trade.query.count() == 0
+    
+    xrp = Balance.query.filter_by(currency='XRP').one()
+    assert (xrp.amount, xrp.locked) == (100.0, 0.0)